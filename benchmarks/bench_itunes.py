@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""Time iTunes library exports against growing library sizes.
+
+Each size runs one sync of PLAYLISTS playlists into an existing library of
+that many tracks: the library is read, every playlist is added and the
+result is written once. The time per library track should stay roughly
+flat as the library grows, i.e. the export scales linearly. The XML writer
+is then compared with plistlib's own on the largest library.
+
+    python benchmarks/bench_itunes.py [--sizes 10000 20000 40000] [--format xml|binary]
+"""
+import io
+import os
+import sys
+import time
+import argparse
+import plistlib
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from plex2mix.exporter import ITunesExporter, PLIST_FORMATS, _write_xml_plist  # noqa: E402
+from plex2mix.records import TrackRecord  # noqa: E402
+
+PLAYLISTS = 300
+TRACKS_PER_PLAYLIST = 100
+
+
+def make_tracks(count: int, start: int = 0) -> list:
+    return [
+        TrackRecord(i, f"Track {i}", f"Artist {i % 500}", f"Album {i % 2000}", 240000, None,
+                    i, f"/library/parts/{i}/file.flac", 30_000_000,
+                    f"/music/Artist {i % 500}/Album {i % 2000}/{i:06d} Track {i}.flac")
+        for i in range(start, start + count)
+    ]
+
+
+def run(size: int, plist_format: str) -> dict:
+    with tempfile.TemporaryDirectory() as library_path:
+        # An existing library of `size` tracks, written by a previous run
+        seed = ITunesExporter(plist_format)
+        seed.export(make_tracks(size), playlist_name="Library", library_path=library_path)
+        seed.flush()
+
+        exporter = ITunesExporter(plist_format)
+        step = max(1, size // PLAYLISTS)
+        start = time.perf_counter()
+        for i in range(PLAYLISTS):
+            tracks = make_tracks(TRACKS_PER_PLAYLIST, start=(i * step) % size)
+            exporter.export(tracks, playlist_name=f"Playlist {i}", library_path=library_path)
+        exporter.flush()
+        elapsed = time.perf_counter() - start
+        file_size = os.path.getsize(os.path.join(library_path, exporter.library_file))
+    return {"size": size, "elapsed": elapsed, "file_size": file_size}
+
+
+def compare_writers(size: int) -> tuple:
+    """Time the exporter's XML writer and plistlib's on the same library, in seconds."""
+    exporter = ITunesExporter()
+    exporter._create_new_library()
+    exporter._add_or_update_playlist("Library", exporter._add_tracks_to_library(make_tracks(size)))
+    plist = exporter._library_plist()
+
+    start = time.perf_counter()
+    _write_xml_plist(io.BytesIO(), plist)
+    ours = time.perf_counter() - start
+    start = time.perf_counter()
+    plistlib.dump(plist, io.BytesIO(), fmt=plistlib.FMT_XML, sort_keys=False)
+    return ours, time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 20_000, 40_000])
+    parser.add_argument("--format", choices=PLIST_FORMATS, default="xml")
+    args = parser.parse_args()
+
+    print(f"{PLAYLISTS} playlists of {TRACKS_PER_PLAYLIST} tracks, {args.format} library")
+    print(f"{'tracks':>8} {'seconds':>9} {'us/track':>9} {'MiB':>7}")
+    for size in args.sizes:
+        result = run(size, args.format)
+        print(f"{result['size']:>8} {result['elapsed']:>9.3f} {result['elapsed'] / size * 1e6:>9.2f} "
+              f"{result['file_size'] / 1024 ** 2:>7.1f}")
+
+    ours, theirs = compare_writers(max(args.sizes))
+    print(f"XML writer on {max(args.sizes)} tracks: {ours:.3f}s, plistlib {theirs:.3f}s ({theirs / ours:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""Compare download order policies on a simulated sync.
+
+A few playlists of tracks with realistic sizes and durations are queued on
+the thread engine, and each download sleeps as long as its file would take
+over a link of RATE bytes per second shared by the threads. For every policy
+the report gives the throughput, the time until the first track is on disk,
+the mean time a track waits for completion and the time until the first
+(or pinned) playlist, e.g. the set being prepared, is complete.
+
+    python benchmarks/bench_order.py [--playlists 3] [--tracks 60] [--threads 4]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import threading
+from statistics import mean
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from plex2mix.downloader import Downloader, ORDER_POLICIES  # noqa: E402
+from plex2mix.engine import ThreadEngine  # noqa: E402
+from plex2mix.records import TrackRecord  # noqa: E402
+
+# Simulated bandwidth of the whole link, scaled down so a run takes seconds
+RATE = 2 * 1024 ** 3
+
+
+class Playlist:
+    def __init__(self, rating_key: int) -> None:
+        self.ratingKey = rating_key
+
+
+class SimulatedDownloader(Downloader):
+    """Downloader whose transfers only take the time the file size implies."""
+
+    def __init__(self, *args, threads: int, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.threads = threads
+        self.started = None
+        self.done = {}
+        self._lock = threading.Lock()
+
+    def _download_track(self, track: TrackRecord, overwrite: bool = False) -> str:
+        time.sleep(track.size * self.threads / RATE)
+        with self._lock:
+            self.done[track.ratingKey] = time.perf_counter() - self.started
+        return track.path
+
+
+def make_playlists(playlists: int, tracks: int, seed: int) -> list:
+    rng = random.Random(seed)
+    result = []
+    for p in range(playlists):
+        items = []
+        for t in range(tracks):
+            duration = int(rng.lognormvariate(12.4, 0.35))  # about 4 minutes
+            # Mostly MP3, with FLAC and the odd long DJ mix in between
+            bitrate = rng.choice([320_000, 320_000, 1_000_000]) // 8
+            key = p * tracks + t
+            items.append(TrackRecord(key, f"Track {key}", "Artist", "Album", duration, None, key,
+                                     f"/parts/{key}", duration // 1000 * bitrate, f"/music/{key}.mp3"))
+        result.append((Playlist(1000 + p), items))
+    return result
+
+
+def run(order: str, playlists: list, threads: int, pinned: tuple = ()) -> dict:
+    engine = ThreadEngine(threads)
+    downloader = SimulatedDownloader(None, "/music", "/playlists", engine=engine, order=order, pinned=pinned,
+                                     threads=threads)
+    downloader.started = time.perf_counter()
+    for playlist, tracks in playlists:
+        for track in tracks:
+            downloader._submit_track(playlist, track)
+    engine.shutdown()
+
+    elapsed = time.perf_counter() - downloader.started
+    # The set being prepared: the pinned playlist if any, otherwise the first one
+    target = next((tracks for playlist, tracks in playlists if playlist.ratingKey in pinned), playlists[0][1])
+    total_bytes = sum(track.size for _, tracks in playlists for track in tracks)
+    return {
+        "tracks_per_second": len(downloader.done) / elapsed,
+        "mib_per_second": total_bytes / elapsed / 1024 ** 2,
+        "first_track": min(downloader.done.values()),
+        "mean_completion": mean(downloader.done.values()),
+        "set_complete": max(downloader.done[track.ratingKey] for track in target),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--playlists", type=int, default=3)
+    parser.add_argument("--tracks", type=int, default=60)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    playlists = make_playlists(args.playlists, args.tracks, args.seed)
+    last = playlists[-1][0].ratingKey
+    runs = [(order, ()) for order in ORDER_POLICIES] + [("playlist", (last,)), ("smallest", (last,))]
+
+    print(f"{args.playlists} playlists of {args.tracks} tracks, {args.threads} threads")
+    print(f"{'policy':<20} {'tracks/s':>9} {'MiB/s':>8} {'first track':>12} {'mean done':>10} {'set done':>9}")
+    for order, pinned in runs:
+        result = run(order, playlists, args.threads, pinned)
+        name = order + (" + pinned" if pinned else "")
+        print(f"{name:<20} {result['tracks_per_second']:>9.1f} {result['mib_per_second']:>8.0f} "
+              f"{result['first_track']:>11.3f}s {result['mean_completion']:>9.3f}s {result['set_complete']:>8.3f}s")
+
+
+if __name__ == "__main__":
+    main()
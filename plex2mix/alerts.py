@@ -0,0 +1,119 @@
+import logging
+import threading
+from typing import Any, Callable, Collection, Dict, List, Optional
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Metadata type and timeline state Plex uses in notifications for playlists
+PLAYLIST_TYPE = 15
+DELETED_STATE = 9
+# Seconds without further changes before a playlist is synced, so a DJ
+# dragging tracks around a crate triggers one sync rather than dozens
+DEBOUNCE_DELAY = 10.0
+RECONNECT_DELAY = 30.0
+
+
+def changed_playlists(data: Dict[str, Any]) -> List[int]:
+    """Return the rating keys of the playlists a server notification reports as changed."""
+    if data.get("type") != "timeline":
+        return []
+    keys = []
+    for entry in data.get("TimelineEntry", []):
+        if entry.get("type") != PLAYLIST_TYPE or entry.get("state") == DELETED_STATE:
+            continue
+        try:
+            key = int(entry["itemID"])
+        except (KeyError, TypeError, ValueError):
+            continue
+        if key not in keys:
+            keys.append(key)
+    return keys
+
+
+class PlaylistWatcher:
+    """Requests a sync of saved playlists as soon as the server reports them changed.
+
+    Listens to the server's notification websocket through plexapi's
+    AlertListener, so `server` only needs a url(key, includeToken) method and
+    can point at a local fake notification server. Changes to playlists in
+    `watched()` are collected until none arrived for `delay` seconds, then
+    passed to `request` in one call. A dropped connection is reopened after
+    RECONNECT_DELAY seconds.
+    """
+
+    def __init__(self, server, request: Callable[[List[int]], None], watched: Callable[[], Collection[int]],
+                 delay: float = DEBOUNCE_DELAY) -> None:
+        try:
+            import websocket  # noqa: F401 (needed by AlertListener)
+        except ImportError as e:
+            raise ImportError("Watching playlists requires websocket-client (pip install 'plex2mix[watch]')") from e
+
+        self.server = server
+        self.request = request
+        self.watched = watched
+        self.delay = delay
+        self._lock = threading.Lock()
+        self._changed: Dict[int, None] = {}
+        self._timer: Optional[threading.Timer] = None
+        self._listener = None
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._listen, name="plex2mix-alerts", daemon=True)
+
+    def start(self) -> None:
+        """Start listening in a background thread."""
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop listening and drop changes that were not requested yet."""
+        self._stopping.set()
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._changed.clear()
+            listener = self._listener
+        if listener is not None and listener._ws is not None:
+            listener.stop()
+        self._thread.join(timeout=5)
+
+    def _listen(self) -> None:
+        from plexapi.alert import AlertListener
+
+        while not self._stopping.is_set():
+            listener = AlertListener(self.server, self._on_alert, self._on_error)
+            with self._lock:
+                self._listener = listener
+            logger.info("Listening for playlist changes")
+            # Runs the websocket on this thread until the connection closes
+            listener.run()
+            if self._stopping.wait(RECONNECT_DELAY):
+                break
+            logger.info("Notification connection closed, reconnecting")
+
+    def _on_alert(self, data: Dict[str, Any]) -> None:
+        watched = self.watched()
+        keys = [key for key in changed_playlists(data) if key in watched]
+        if not keys:
+            return
+        logger.debug(f"Playlists changed on the server: {keys}")
+        with self._lock:
+            if self._stopping.is_set():
+                return
+            self._changed.update(dict.fromkeys(keys))
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.delay, self._fire)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _on_error(self, error: Exception) -> None:
+        logger.warning(f"Notification connection error: {error}")
+
+    def _fire(self) -> None:
+        with self._lock:
+            keys = list(self._changed)
+            self._changed.clear()
+            self._timer = None
+        if keys:
+            logger.info(f"Requesting sync of {len(keys)} changed playlists")
+            self.request(keys)
@@ -0,0 +1,84 @@
+import os
+import json
+import time
+import logging
+from typing import Any, Callable, List, Optional
+
+from plex2mix.records import PlaylistRecord
+from plex2mix.stats import RunStats
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+class Catalog:
+    """Cached listing of the audio playlists on the Plex server.
+
+    The listing is kept in memory for the lifetime of the process, so indices
+    shown by `list` stay stable across an interactive session, and on disk for
+    `ttl` seconds so back-to-back commands skip the network round-trip. The
+    server connection is only requested, through `connect`, when the listing
+    actually has to be fetched.
+    """
+
+    def __init__(self, connect: Callable[[], Any], cache_file: str, ttl: int = 300, use_cache: bool = True,
+                 stats: Optional[RunStats] = None) -> None:
+        self.connect = connect
+        self.cache_file = os.path.expanduser(str(cache_file))
+        self.ttl = ttl
+        self.use_cache = use_cache
+        self.stats = stats or RunStats()
+        self._playlists: Optional[List[PlaylistRecord]] = None
+
+    def playlists(self, refresh: bool = False) -> List[PlaylistRecord]:
+        """Return the playlist listing, fetching it from the server only when needed."""
+        if self._playlists is not None and not refresh:
+            return self._playlists
+
+        if not refresh and self.use_cache:
+            self._playlists = self._load()
+        if self._playlists is None or refresh:
+            self._playlists = self._fetch()
+            self._store(self._playlists)
+        return self._playlists
+
+    def refresh(self) -> List[PlaylistRecord]:
+        """Drop the cached listing and fetch it again from the server."""
+        return self.playlists(refresh=True)
+
+    def _fetch(self) -> List[PlaylistRecord]:
+        logger.debug("Fetching playlists from Plex server")
+        server = self.connect()
+        with self.stats.timer("catalog"):
+            playlists = [
+                PlaylistRecord.from_playlist(p) for p in server.playlists()
+                if getattr(p, 'playlistType', None) == 'audio'
+            ]
+        logger.info(f"Found {len(playlists)} audio playlists")
+        return playlists
+
+    def _load(self) -> Optional[List[PlaylistRecord]]:
+        try:
+            with open(self.cache_file, "r", encoding="utf-8") as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        age = time.time() - cache.get("fetched_at", 0)
+        if age > self.ttl:
+            logger.debug(f"Playlist cache expired ({int(age)}s old)")
+            return None
+
+        playlists = [PlaylistRecord(*entry) for entry in cache.get("playlists", [])]
+        logger.info(f"Loaded {len(playlists)} playlists from cache ({int(age)}s old)")
+        return playlists
+
+    def _store(self, playlists: List[PlaylistRecord]) -> None:
+        cache = {"fetched_at": time.time(), "playlists": [p.to_list() for p in playlists]}
+        try:
+            temp_file = self.cache_file + ".tmp"
+            with open(temp_file, "w", encoding="utf-8") as f:
+                json.dump(cache, f, ensure_ascii=False)
+            os.replace(temp_file, self.cache_file)
+        except OSError as e:
+            logger.warning(f"Could not write playlist cache: {e}")
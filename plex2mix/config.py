@@ -0,0 +1,129 @@
+import os
+import time
+import logging
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Dict
+
+import yaml
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# The libyaml bindings parse and emit several times faster, PyYAML's own
+# classes are used when it was built without them
+Loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+Dumper = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
+# Minimum number of seconds between two debounced writes of the file
+SAVE_INTERVAL = 5.0
+PLAYLIST_LISTS = ("saved", "ignored")
+
+
+class ConfigStore:
+    """The configuration file, kept in memory and written back atomically.
+
+    Saved and ignored playlists are held as sets for constant time membership
+    checks and are written to the file as sorted lists. save() only writes when
+    SAVE_INTERVAL has passed since the previous write, flush() writes whatever
+    is still pending.
+    """
+
+    def __init__(self, path: Path, interval: float = SAVE_INTERVAL) -> None:
+        self.path = Path(path)
+        self.interval = interval
+        self.config: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._written = 0.0
+
+    def load(self) -> Dict[str, Any]:
+        """Read the file, creating it when missing, and return the config dict."""
+        logger.debug(f"Loading configuration from {self.path}")
+        if not self.path.parent.exists():
+            logger.info(f"Creating config directory: {self.path.parent}")
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        if self.path.exists():
+            with self.path.open("r") as f:
+                self.config = yaml.load(f, Loader=Loader) or {}
+        else:
+            logger.info(f"Creating new config file: {self.path}")
+            self.config = {}
+            self.save(force=True)
+
+        playlists = self.config.get("playlists")
+        if isinstance(playlists, dict):
+            for name in PLAYLIST_LISTS:
+                playlists[name] = set(playlists.get(name) or ())
+
+        logger.debug(f"Loaded configuration with {len(self.config)} keys")
+        return self.config
+
+    def reload(self) -> Dict[str, Any]:
+        """Write pending changes, then read the file again into the same config dict.
+
+        Lets a long-running process pick up changes other invocations made to
+        the file, while references to the dict it handed out stay valid.
+        """
+        self.flush()
+        config = self.config
+        self.load()
+        config.clear()
+        config.update(self.config)
+        self.config = config
+        return config
+
+    def dump(self) -> Dict[str, Any]:
+        """Return the config as written to the file, with playlist sets as sorted lists."""
+        data = dict(self.config)
+        playlists = data.get("playlists")
+        if isinstance(playlists, dict):
+            data["playlists"] = {
+                key: sorted(value) if key in PLAYLIST_LISTS else value
+                for key, value in playlists.items()
+            }
+        return data
+
+    def save(self, force: bool = False) -> None:
+        """Mark the config changed and write it unless it was written less than interval ago."""
+        with self._lock:
+            self._dirty = True
+            if not force and time.monotonic() - self._written < self.interval:
+                logger.debug("Deferring configuration write")
+                return
+            self._write()
+
+    def flush(self) -> None:
+        """Write pending changes, if any."""
+        with self._lock:
+            if self._dirty:
+                self._write()
+
+    def discard(self) -> None:
+        """Forget pending changes, e.g. after the file was deleted."""
+        with self._lock:
+            self._dirty = False
+
+    def _write(self) -> None:
+        # Written next to the file and renamed over it, so a crash mid-write
+        # leaves the previous file (and its token) in place
+        logger.debug(f"Saving configuration to {self.path}")
+        fd, temp_path = tempfile.mkstemp(dir=str(self.path.parent), prefix=f".{self.path.name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                yaml.dump(self.dump(), f, Dumper=Dumper, default_flow_style=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+        self._dirty = False
+        self._written = time.monotonic()
+        logger.debug("Configuration saved successfully")
+
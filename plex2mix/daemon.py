@@ -0,0 +1,195 @@
+import os
+import json
+import time
+import socket
+import logging
+import threading
+import socketserver
+from typing import Any, Callable, Dict, List, Optional
+
+from plex2mix.stats import RunStats
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Seconds between two scheduled syncs when neither the command line nor the config sets it
+DEFAULT_INTERVAL = 900
+COMMANDS = ("status", "sync", "stop")
+
+
+class Daemon:
+    """Long-running process syncing playlists on a schedule or on request.
+
+    Syncs run one at a time on the thread calling run(), through the `sync`
+    callback, which receives the rating keys to sync or None for every saved
+    playlist. Requests arriving while a sync runs are merged and handled by the
+    next one, and downloads of the requested playlists still queued by the
+    running sync are moved ahead through the `promote` callback. A Unix socket
+    accepts the commands `status`, `sync [keys...]` and `stop`, one per
+    connection, and answers with a line of JSON.
+    """
+
+    def __init__(self, sync: Callable[[Optional[List[int]]], None], socket_path: str,
+                 interval: int = DEFAULT_INTERVAL, stats: Optional[RunStats] = None,
+                 pending: Optional[Callable[[], int]] = None,
+                 promote: Optional[Callable[[List[int]], int]] = None) -> None:
+        self.sync = sync
+        self.socket_path = os.path.expanduser(str(socket_path))
+        self.interval = interval
+        self.stats = stats or RunStats()
+        self.pending = pending
+        self.promote = promote
+        self._condition = threading.Condition()
+        self._requested: Dict[int, None] = {}
+        self._sync_all = False
+        self._stopping = False
+        self._running = False
+        self._next_run = time.time()
+        self._syncs = 0
+        self._last_run: Optional[Dict[str, Any]] = None
+        self._last_error: Optional[str] = None
+        self._server: Optional[socketserver.BaseServer] = None
+
+    def request(self, rating_keys: Optional[List[int]] = None) -> None:
+        """Queue a sync of the given playlists, or of every saved playlist."""
+        with self._condition:
+            if rating_keys:
+                self._requested.update(dict.fromkeys(rating_keys))
+            else:
+                self._sync_all = True
+            self._condition.notify()
+            running = self._running
+        if running and rating_keys and self.promote is not None:
+            self.promote(rating_keys)
+
+    def stop(self) -> None:
+        """Stop once the running sync, if any, is over."""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+
+    def status(self) -> Dict[str, Any]:
+        """Return the daemon's state, queue depth and throughput as a JSON-serializable dict."""
+        with self._condition:
+            status = {
+                "pid": os.getpid(),
+                "running": self._running,
+                "syncs": self._syncs,
+                "queued": {"all": self._sync_all, "playlists": len(self._requested)},
+                "next_run": int(self._next_run),
+                "last_run": self._last_run,
+                "last_error": self._last_error,
+            }
+        if self.pending is not None:
+            status["queued"]["tracks"] = self.pending()
+        if status["running"]:
+            current = self.stats.report()
+            status["current"] = {key: current[key] for key in ("elapsed", "bytes", "bytes_per_second",
+                                                               "tracks", "tracks_per_second")}
+        return status
+
+    def run(self) -> None:
+        """Serve the socket and run syncs until stop() is called."""
+        self._listen()
+        try:
+            while True:
+                with self._condition:
+                    while not self._stopping and not self._due():
+                        self._condition.wait(max(0.0, self._next_run - time.time()))
+                    if self._stopping:
+                        break
+                    if self._sync_all or time.time() >= self._next_run:
+                        rating_keys = None
+                        self._next_run = time.time() + self.interval
+                    else:
+                        rating_keys = list(self._requested)
+                    self._requested.clear()
+                    self._sync_all = False
+                    self._running = True
+                self._run_sync(rating_keys)
+        finally:
+            self._close()
+
+    def _due(self) -> bool:
+        return self._sync_all or bool(self._requested) or time.time() >= self._next_run
+
+    def _run_sync(self, rating_keys: Optional[List[int]]) -> None:
+        what = "saved playlists" if rating_keys is None else f"{len(rating_keys)} requested playlists"
+        logger.info(f"Daemon syncing {what}")
+        error = None
+        try:
+            self.sync(rating_keys)
+        except Exception as e:
+            logger.error(f"Daemon sync failed: {e}")
+            error = str(e)
+        report = self.stats.report()
+        with self._condition:
+            self._running = False
+            self._syncs += 1
+            self._last_run = report
+            self._last_error = error
+
+    def _listen(self) -> None:
+        if os.path.exists(self.socket_path):
+            try:
+                send(self.socket_path, "status")
+            except OSError:
+                logger.info(f"Removing stale socket {self.socket_path}")
+                os.remove(self.socket_path)
+            else:
+                raise RuntimeError(f"A daemon is already listening on {self.socket_path}")
+
+        daemon = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self) -> None:
+                line = self.rfile.readline().decode("utf-8").strip()
+                reply = daemon._handle(line)
+                self.wfile.write((json.dumps(reply) + "\n").encode("utf-8"))
+
+        self._server = socketserver.ThreadingUnixStreamServer(self.socket_path, Handler)
+        self._server.daemon_threads = True
+        os.chmod(self.socket_path, 0o600)
+        threading.Thread(target=self._server.serve_forever, name="plex2mix-daemon", daemon=True).start()
+        logger.info(f"Daemon listening on {self.socket_path}, syncing every {self.interval}s")
+
+    def _handle(self, line: str) -> Dict[str, Any]:
+        command, *args = line.split() or [""]
+        logger.debug(f"Daemon received command: {line}")
+        if command == "status":
+            return {"ok": True, "status": self.status()}
+        if command == "sync":
+            try:
+                rating_keys = [int(arg) for arg in args]
+            except ValueError:
+                return {"ok": False, "error": "sync takes playlist rating keys"}
+            self.request(rating_keys or None)
+            return {"ok": True}
+        if command == "stop":
+            self.stop()
+            return {"ok": True}
+        return {"ok": False, "error": f"unknown command '{command}', expected one of {', '.join(COMMANDS)}"}
+
+    def _close(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        try:
+            os.remove(self.socket_path)
+        except OSError:
+            pass
+        logger.info("Daemon stopped")
+
+
+def send(socket_path: str, command: str, timeout: float = 10.0) -> Dict[str, Any]:
+    """Send one command to a running daemon and return its reply."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(os.path.expanduser(str(socket_path)))
+        sock.sendall((command + "\n").encode("utf-8"))
+        with sock.makefile("rb") as f:
+            line = f.readline()
+    if not line:
+        raise OSError("The daemon closed the connection without replying")
+    return json.loads(line)
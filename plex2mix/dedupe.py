@@ -0,0 +1,235 @@
+import os
+import mmap
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional
+
+try:
+    import xxhash
+except ImportError:  # optional, blake2b is used instead
+    xxhash = None
+
+from plex2mix.transfer import CORRUPT_SUFFIX, PART_SUFFIX
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+STORE_DIR = ".plex2mix-store"
+# Files being written, by atomic saves and by link()
+TEMP_SUFFIXES = (".tmp", ".link")
+SAMPLE_SIZE = 64 * 1024
+HASH_CHUNK_SIZE = 16 * 1024 * 1024
+
+
+# Stored digests are prefixed with it, so switching hash functions is detected
+HASH_NAME = "xxh3_128" if xxhash is not None else "blake2b"
+
+
+def _hasher():
+    return xxhash.xxh3_128() if xxhash is not None else hashlib.blake2b(digest_size=16)
+
+
+def fast_hash(path: str) -> str:
+    """Hash a file's size and its first and last 64 KiB.
+
+    Cheap enough to run over a whole library, and only files whose fast
+    hashes match ever need a full_hash() to confirm they are identical.
+    """
+    size = os.path.getsize(path)
+    digest = _hasher()
+    digest.update(str(size).encode("ascii"))
+    with open(path, "rb") as f:
+        digest.update(f.read(SAMPLE_SIZE))
+        if size > SAMPLE_SIZE:
+            f.seek(max(SAMPLE_SIZE, size - SAMPLE_SIZE))
+            digest.update(f.read(SAMPLE_SIZE))
+    return digest.hexdigest()
+
+
+def full_hash(path: str) -> str:
+    """Hash the whole content of a file, reading it through a memory map."""
+    digest = _hasher()
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return digest.hexdigest()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            view = memoryview(m)
+            try:
+                for offset in range(0, len(view), HASH_CHUNK_SIZE):
+                    digest.update(view[offset:offset + HASH_CHUNK_SIZE])
+            finally:
+                view.release()
+    return digest.hexdigest()
+
+
+def file_digest(path: str) -> str:
+    """Return the full hash of a file tagged with the hash function used."""
+    return f"{HASH_NAME}:{full_hash(path)}"
+
+
+def link(source: str, target: str) -> None:
+    """Atomically replace target with a hardlink to source."""
+    temp_path = target + ".link"
+    os.link(source, temp_path)
+    try:
+        os.replace(temp_path, target)
+    except OSError:
+        os.remove(temp_path)
+        raise
+
+
+def same_file(a: str, b: str) -> bool:
+    """Whether two paths already point at the same inode."""
+    try:
+        return os.path.samefile(a, b)
+    except OSError:
+        return False
+
+
+class DedupeStore:
+    """Content-addressed store of downloaded files, kept next to the artist/album tree.
+
+    Every file added is hardlinked into the store under its fast hash. A later
+    file with the same content is replaced by a hardlink to the stored copy, so
+    the recording is kept on disk once however many paths it appears under.
+    """
+
+    def __init__(self, root: str) -> None:
+        self.root = os.path.join(os.path.expanduser(root), STORE_DIR)
+        self._lock = threading.Lock()
+        self.linked = 0
+        self.reclaimed = 0
+
+    def _store_path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key)
+
+    def add(self, path: str) -> bool:
+        """Store a file, or link it to an identical stored one. Returns whether it was linked."""
+        key = fast_hash(path)
+        stored = self._store_path(key)
+        with self._lock:
+            if not os.path.exists(stored):
+                os.makedirs(os.path.dirname(stored), exist_ok=True)
+                os.link(path, stored)
+                return False
+            if same_file(stored, path):
+                return False
+            # Matching samples are not proof, compare the full content before linking
+            if full_hash(stored) != full_hash(path):
+                logger.warning(f"Fast hash collision between {path} and {stored}, keeping both")
+                return False
+            size = os.path.getsize(path)
+            link(stored, path)
+            self.linked += 1
+            self.reclaimed += size
+            logger.info(f"Linked duplicate {path} to stored copy {key}")
+            return True
+
+    def evict(self, path: str) -> bool:
+        """Remove the stored copy a file is linked to, as when its content is corrupt.
+
+        Returns whether a stored copy was removed.
+        """
+        if os.stat(path).st_nlink == 1:
+            return False
+        # A corrupted sample changes the fast hash, so fall back to the inode
+        stored = self._store_path(fast_hash(path))
+        candidates = [stored] if same_file(stored, path) else (
+            os.path.join(directory, name) for directory, _, files in os.walk(self.root) for name in files)
+        with self._lock:
+            for stored in candidates:
+                if same_file(stored, path):
+                    os.remove(stored)
+                    logger.info(f"Evicted {path} from the dedupe store")
+                    return True
+        return False
+
+    def prune(self) -> int:
+        """Remove stored files no longer linked from the download tree."""
+        removed = 0
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                stored = os.path.join(directory, name)
+                if os.stat(stored).st_nlink == 1:
+                    os.remove(stored)
+                    removed += 1
+        return removed
+
+
+class DuplicateGroup(NamedTuple):
+    size: int
+    paths: List[str]
+
+
+def iter_files(root: str, exclude: Iterable[str] = ()) -> Iterator[str]:
+    """Yield every downloaded file under root.
+
+    The store, temporary files, partial downloads, corrupt copies and the
+    directories in exclude, such as the exported playlists, are skipped.
+    """
+    excluded = {os.path.realpath(os.path.expanduser(path)) for path in exclude}
+    for directory, dirs, files in os.walk(root):
+        dirs[:] = [d for d in dirs
+                   if d != STORE_DIR and os.path.realpath(os.path.join(directory, d)) not in excluded]
+        if os.path.realpath(directory) in excluded:
+            continue
+        for name in files:
+            if not name.endswith((PART_SUFFIX, CORRUPT_SUFFIX) + TEMP_SUFFIXES):
+                yield os.path.join(directory, name)
+
+
+def find_duplicates(root: str, workers: Optional[int] = None, exclude: Iterable[str] = ()) -> List[DuplicateGroup]:
+    """Group files under root whose content is identical.
+
+    Files are first grouped by size, then by fast hash, then by full hash, with
+    each hashing pass spread over a thread pool. Paths that are already
+    hardlinks of each other are counted once.
+    """
+    by_size: Dict[int, List[str]] = {}
+    seen_inodes = set()
+    for path in iter_files(root, exclude):
+        st = os.stat(path)
+        if (st.st_dev, st.st_ino) in seen_inodes:
+            continue
+        seen_inodes.add((st.st_dev, st.st_ino))
+        by_size.setdefault(st.st_size, []).append(path)
+
+    candidates = [paths for size, paths in by_size.items() if len(paths) > 1 and size > 0]
+    logger.info(f"Hashing {sum(len(paths) for paths in candidates)} files with a shared size")
+
+    groups = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for hash_fn in (fast_hash, full_hash):
+            paths = [path for group in candidates for path in group]
+            keys = dict(zip(paths, pool.map(hash_fn, paths)))
+            refined = []
+            for group in candidates:
+                by_hash: Dict[str, List[str]] = {}
+                for path in group:
+                    by_hash.setdefault(keys[path], []).append(path)
+                refined.extend(matches for matches in by_hash.values() if len(matches) > 1)
+            candidates = refined
+
+    for paths in candidates:
+        groups.append(DuplicateGroup(os.path.getsize(paths[0]), sorted(paths)))
+    return groups
+
+
+def dedupe(root: str, dry_run: bool = False, workers: Optional[int] = None, exclude: Iterable[str] = ()) -> tuple:
+    """Hardlink identical files under root together, leaving the directories in exclude alone.
+
+    Returns (groups, files linked, bytes reclaimed).
+    """
+    groups = find_duplicates(root, workers, exclude)
+    linked = reclaimed = 0
+    for group in groups:
+        keep, duplicates = group.paths[0], group.paths[1:]
+        for path in duplicates:
+            logger.info(f"{'Would link' if dry_run else 'Linking'} {path} to {keep}")
+            if not dry_run:
+                link(keep, path)
+            linked += 1
+            reclaimed += group.size
+    return len(groups), linked, reclaimed
@@ -1,157 +1,590 @@
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import Future
 import os
+import time
+import asyncio
+import hashlib
 import logging
-from plexapi.server import PlexServer
-from plexapi.playlist import Playlist
-from plexapi.audio import Track
+import threading
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import Iterable, Iterator, List, Dict, NamedTuple, Optional, Set, TYPE_CHECKING
+
+from plex2mix import transfer
+from plex2mix.dedupe import DedupeStore, file_digest
+from plex2mix.engine import ThreadEngine, CONNECT_TIMEOUT, READ_TIMEOUT
+from plex2mix.exporter import WRITE_BUFFER_SIZE
+from plex2mix.index import TrackIndex, PlaylistState, PlaylistSnapshot
+from plex2mix.records import TrackRecord
+from plex2mix.stats import RunStats
+
+if TYPE_CHECKING:
+    from plexapi.server import PlexServer
+    from plexapi.playlist import Playlist
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
+# Number of playlist items requested from the server at once
+ITEMS_PAGE_SIZE = 500
+# Orders in which queued downloads are started: playlist by playlist, smallest
+# file first (shortest job first) or shortest track first
+ORDER_POLICIES = ("playlist", "smallest", "shortest")
+
+
+class ExportError(RuntimeError):
+    """A playlist failed to export after its downloads were submitted.
+
+    The downloads keep running, `tasks` holds them so they can still be waited for.
+    """
+
+    def __init__(self, failed: List[str], tasks: List[Future]) -> None:
+        super().__init__(f"Export failed for format(s): {', '.join(failed)}")
+        self.failed = failed
+        self.tasks = tasks
+
+
+def _timestamp(value) -> Optional[int]:
+    """Return a Plex datetime attribute as an integer epoch timestamp."""
+    if value is None:
+        return None
+    if hasattr(value, "timestamp"):
+        return int(value.timestamp())
+    return int(value)
+
+
+def _items_digest(playlist: "Playlist"):
+    """Start the fingerprint of a playlist, fed with each item id in order."""
+    return hashlib.sha1(str(playlist.title).encode("utf-8"))
+
+
+def _items_hash(playlist: "Playlist", tracks: List[TrackRecord]) -> str:
+    """Fingerprint a playlist's title and ordered item ids."""
+    digest = _items_digest(playlist)
+    for track in tracks:
+        digest.update(b"\0" + str(track.ratingKey).encode("ascii"))
+    return digest.hexdigest()
+
+
+class PlaylistDelta(NamedTuple):
+    """Items added to and removed from a playlist since its exports were last written."""
+    added: int
+    removed: int
+
 
 class Downloader:
     """Handles downloading audio tracks from Plex playlists."""
 
-    def __init__(self, server: PlexServer, path: str, playlists_path: str, threads: int = 4, exporter=None) -> None:
+    def __init__(self, server: "PlexServer", path: str, playlists_path: str, threads: int = 4, exporters=None,
+                 index: Optional[TrackIndex] = None, engine=None, throttle=None,
+                 store: Optional[DedupeStore] = None, stats: Optional[RunStats] = None,
+                 order: str = "playlist", pinned: Iterable[int] = ()) -> None:
+        if order not in ORDER_POLICIES:
+            raise ValueError(f"Unknown download order: {order}")
         self.server = server
         self.path = os.path.expanduser(path)
         self.playlists_path = os.path.expanduser(playlists_path)
-        self.pool = ThreadPoolExecutor(max_workers=threads)
-        self.exporter = exporter
-        logger.info(f"Initialized downloader with {threads} threads")
+        self.engine = engine or ThreadEngine(threads)
+        self.exporters = list(exporters or [])
+        self.index = index
+        self.throttle = throttle
+        self.store = store
+        self.stats = stats or RunStats()
+        self.order = order
+        # Playlists whose downloads start before those of all other playlists
+        self.pinned = set(pinned)
+        # Position of each playlist in the run, for the playlist order
+        self._ranks: Dict[int, int] = {}
+        # Run-wide registry of downloads keyed by local file path, so a track
+        # shared by several playlists is only ever fetched once per run
+        self._registry: Dict[str, Future] = {}
+        self._registry_lock = threading.Lock()
+        self.coalesced = 0
+        # Playlist states and manifests waiting for their downloads to finish before being recorded
+        self._pending_states: Dict[int, PlaylistState] = {}
+        self._pending_manifests: Dict[int, Set[int]] = {}
+        # HTTP requests made to list the items of each playlist this run
+        self.item_requests: Dict[int, int] = {}
+        # Playlists synced this run from the difference with their last export
+        self.deltas: Dict[int, PlaylistDelta] = {}
+        logger.info(f"Initialized downloader with {type(self.engine).__name__}")
         logger.info(f"Music path: {self.path}")
         logger.info(f"Playlists path: {self.playlists_path}")
-        if self.exporter:
-            logger.info(f"Using exporter: {type(self.exporter).__name__}")
-
-    def get_playlists(self) -> List[Playlist]:
-        """Get all audio playlists from the Plex server."""
-        logger.debug("Fetching playlists from Plex server")
-        playlists = [p for p in self.server.playlists() if getattr(p, 'playlistType', None) == 'audio']
-        logger.info(f"Found {len(playlists)} audio playlists")
-        return playlists
-
-    def _path(self, track: Track) -> tuple[str, str]:
-        """Return (album_path, filepath) for a track."""
-        artist, album = track.grandparentTitle or "Unknown Artist", track.parentTitle or "Unknown Album"
-        album_path = os.path.join(self.path, artist, album)
-        _, file = os.path.split(track.media[0].parts[0].file)
-        filepath = os.path.join(album_path, file)
-        return album_path, filepath
-
-    def _download_track(self, track: Track, overwrite: bool = False) -> str:
-        """Download a single track if missing or incomplete."""
-        album_path, filepath = self._path(track)
-        
-        # Ensure directory exists
-        os.makedirs(album_path, exist_ok=True)
-        
-        size_on_server = track.media[0].parts[0].size
-        track_name = f"{track.grandparentTitle or 'Unknown'} - {track.title or 'Unknown'}"
+        for exporter in self.exporters:
+            logger.info(f"Using exporter: {type(exporter).__name__}")
+
+    def is_unchanged(self, playlist: "Playlist") -> bool:
+        """Whether the playlist's updatedAt and leafCount match its last recorded sync."""
+        if self.index is None:
+            return False
+        state = self.index.get_playlist(playlist.ratingKey)
+        return (state is not None and state.updated_at == _timestamp(playlist.updatedAt)
+                and state.leaf_count == playlist.leafCount
+                and self.index.get_manifest(playlist.ratingKey) is not None)
+
+    def commit_playlist(self, playlist: "Playlist") -> None:
+        """Record a playlist as synced once all of its downloads succeeded."""
+        state = self._pending_states.pop(playlist.ratingKey, None)
+        manifest = self._pending_manifests.pop(playlist.ratingKey, None)
+        if self.index is not None:
+            if state is not None:
+                self.index.put_playlist(playlist.ratingKey, state)
+            if manifest is not None:
+                self.index.put_manifest(playlist.ratingKey, manifest)
+
+    def start_run(self) -> None:
+        """Forget downloads registered by a previous run."""
+        with self._registry_lock:
+            self._registry.clear()
+            self.coalesced = 0
+        self.item_requests.clear()
+        self.deltas.clear()
+        self._ranks.clear()
+
+    def pending_tracks(self) -> int:
+        """Number of downloads scheduled this run that are not finished yet."""
+        with self._registry_lock:
+            return sum(1 for future in self._registry.values() if not future.done())
+
+    def _priority(self, playlist: "Playlist", track: TrackRecord) -> tuple:
+        """Sort key of a track download under the download order, lowest first."""
+        group = 1 if playlist.ratingKey in self.pinned else 2
+        if self.order == "smallest":
+            return group, track.size
+        if self.order == "shortest":
+            return group, track.duration if track.duration is not None else float("inf")
+        rank = self._ranks.setdefault(playlist.ratingKey, len(self._ranks))
+        return group, rank
+
+    def promote(self, rating_keys: Iterable[int]) -> int:
+        """Start the queued downloads of the given playlists before all others."""
+        moved = self.engine.promote(set(rating_keys))
+        if moved:
+            logger.info(f"Moved {moved} queued downloads ahead of the queue")
+        return moved
+
+    def _submit_track(self, playlist: "Playlist", track: TrackRecord, overwrite: bool = False) -> Future:
+        """Schedule a track download, reusing the pending or finished one for the same file."""
+        with self._registry_lock:
+            future = self._registry.get(track.path)
+            if future is not None:
+                self.coalesced += 1
+                logger.debug(f"Reusing download already scheduled this run for '{track.path}'")
+                return future
+            fn = self._download_track_async if self.engine.asynchronous else self._download_track
+            future = self.engine.submit(fn, track, overwrite, priority=self._priority(playlist, track),
+                                        tag=playlist.ratingKey)
+            self._registry[track.path] = future
+            return future
+
+    def _part_url(self, part_key: str) -> str:
+        """Return the authenticated download URL of a media part."""
+        return self.server.url(f"{part_key}?download=1", includeToken=True)
+
+    def _plan_track(self, track: TrackRecord, overwrite: bool = False) -> Optional[bool]:
+        """Decide whether a track must be fetched.
+
+        Returns None when the local copy is up to date, otherwise whether the
+        transfer has to restart from byte zero instead of resuming.
+        """
+        filepath = track.path
+        size_on_server = track.size
+        track_name = f"{track.artist} - {track.title or 'Unknown'}"
+
+        # Trust the index for tracks that have not changed since they were downloaded
+        if not overwrite and self._is_indexed(track):
+            logger.debug(f"Skipping '{track_name}' (indexed)")
+            return None
 
         if os.path.exists(filepath):
             local_size = os.path.getsize(filepath)
             if overwrite:
                 logger.info(f"Overwriting '{track_name}' (forced)")
-                track.download(album_path, keep_original_name=True)
+                return True
             elif local_size < size_on_server:
-                logger.warning(f"Redownloading '{track_name}' (incomplete: {local_size}/{size_on_server} bytes)")
-                track.download(album_path, keep_original_name=True)
+                if os.stat(filepath).st_nlink > 1:
+                    # Appending would also change every other link to this content
+                    logger.warning(f"Replacing '{track_name}' (linked copy, {local_size}/{size_on_server} bytes)")
+                    return True
+                logger.warning(f"Resuming '{track_name}' (incomplete: {local_size}/{size_on_server} bytes)")
+                os.replace(filepath, transfer.part_path(filepath))
+                return False
             else:
                 logger.debug(f"Skipping '{track_name}' (already exists)")
-        else:
-            logger.info(f"Downloading '{track_name}'")
-            track.download(album_path, keep_original_name=True)
+                self._record_track(track)
+                return None
+
+        logger.info(f"Downloading '{track_name}'")
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        return overwrite
+
+    def _is_indexed(self, track: TrackRecord) -> bool:
+        """Whether the index holds an up to date copy of a track."""
+        if self.index is None:
+            return False
+        entry = self.index.get(track.partId)
+        return (entry is not None and entry.path == track.path and entry.size == track.size
+                and entry.updated_at == track.updatedAt)
+
+    def _store_track(self, track: TrackRecord) -> None:
+        """Hand a fresh download to the dedupe store, if one is configured."""
+        if self.store is None:
+            return
+        try:
+            self.store.add(track.path)
+        except OSError as e:
+            logger.warning(f"Could not deduplicate '{track.path}': {e}")
+
+    def _record_track(self, track: TrackRecord, digest: Optional[str] = None) -> None:
+        """Remember the local state of a track in the index."""
+        if self.index is not None:
+            self.index.record(track.partId, track.path, track.updatedAt, digest)
+
+    def _digest_track(self, track: TrackRecord) -> Optional[str]:
+        """Checksum a fresh download for later integrity checks, while it is still cached."""
+        if self.index is None:
+            return None
+        return file_digest(track.path)
+
+    def _download_track(self, track: TrackRecord, overwrite: bool = False) -> str:
+        """Download a single track if missing or incomplete."""
+        start = time.perf_counter()
+        transferred = None
+        try:
+            with self.stats.timer("plan"):
+                restart = self._plan_track(track, overwrite)
+            if restart is not None:
+                with self.stats.timer("transfer"):
+                    transferred = transfer.fetch(self.server._session, self._part_url(track.partKey), track.path,
+                                                 track.size, restart=restart, throttle=self.throttle,
+                                                 timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+                self._store_track(track)
+                self._record_track(track, self._digest_track(track))
+        except Exception:
+            self.stats.track(time.perf_counter() - start, failed=True)
+            raise
+        self.stats.track(time.perf_counter() - start, transferred)
+        return track.path
+
+    async def _download_track_async(self, track: TrackRecord, overwrite: bool = False) -> str:
+        """Coroutine counterpart of _download_track for the async engine."""
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        transferred = None
+        try:
+            # Index lookups and stat calls may block, keep them off the event loop
+            with self.stats.timer("plan"):
+                restart = await loop.run_in_executor(None, self._plan_track, track, overwrite)
+            if restart is not None:
+                with self.stats.timer("transfer"):
+                    transferred = await transfer.fetch_async(self.engine.session, self._part_url(track.partKey),
+                                                             track.path, track.size, restart=restart,
+                                                             throttle=self.throttle)
+                await loop.run_in_executor(None, self._store_track, track)
+                self._record_track(track, await loop.run_in_executor(None, self._digest_track, track))
+        except Exception:
+            self.stats.track(time.perf_counter() - start, failed=True)
+            raise
+        self.stats.track(time.perf_counter() - start, transferred)
+        return track.path
+
+    def iter_items(self, playlist: "Playlist", page_size: int = ITEMS_PAGE_SIZE) -> Iterator[TrackRecord]:
+        """Yield the tracks of a playlist page by page as they arrive from the server.
+
+        Each page is one request whose raw XML already carries the media parts,
+        so no track is ever reloaded to resolve them.
+        """
+        start = requests = count = 0
+        while True:
+            with self.stats.timer("items"):
+                container = self.server.query(f"{playlist.key}/items", headers={
+                    "X-Plex-Container-Start": str(start),
+                    "X-Plex-Container-Size": str(page_size),
+                })
+            requests += 1
+            self.item_requests[playlist.ratingKey] = requests
+            items = list(container)
+            for elem in items:
+                if elem.tag != "Track":
+                    continue
+                track = TrackRecord.from_element(elem, self.path)
+                if track is None:
+                    logger.warning(f"Skipping '{elem.get('title')}' in '{playlist.title}': no media part")
+                    continue
+                count += 1
+                yield track
+
+            start += len(items)
+            total = int(container.get("totalSize", start))
+            if not items or start >= total:
+                break
+        logger.info(f"Playlist '{playlist.title}' contains {count} tracks, listed in {requests} requests")
 
-        return filepath
+    def fetch_items(self, playlist: "Playlist") -> List[TrackRecord]:
+        """Fetch all tracks of a playlist from the server as track records."""
+        return list(self.iter_items(playlist))
 
-    def download(self, playlist: Playlist, overwrite: bool = False):
-        """Download all tracks in a playlist and export playlist file."""
+    def download(self, playlist: "Playlist", overwrite: bool = False, incremental: bool = False,
+                 tracks: Optional[Iterable[TrackRecord]] = None):
+        """Download all tracks in a playlist once and export it with every configured exporter.
+
+        With incremental set, a playlist whose items are identical to its last
+        recorded sync is neither downloaded nor re-exported, and one that changed
+        is synced from the difference with its last export, see _download_delta().
+        Tracks fetched ahead of time with fetch_items() can be passed in to skip
+        the round-trip, otherwise they are streamed from the server and
+        downloads start with the first page.
+        """
         logger.info(f"Starting download for playlist '{playlist.title}'")
         
         tasks = []
-        track_data = []
-        
-        # Get all tracks first
-        tracks = list(playlist.items())
-        logger.info(f"Playlist '{playlist.title}' contains {len(tracks)} tracks")
-        
-        # Download tracks
-        for i, track in enumerate(tracks, 1):
-            logger.debug(f"Submitting track {i}/{len(tracks)} for download: {track.title}")
-            future = self.pool.submit(self._download_track, track, overwrite)
-            tasks.append(future)
-            
-            # Collect track metadata for playlist export
-            album_path, filepath = self._path(track)
-            track_info = {
-                'title': track.title,
-                'artist': track.grandparentTitle or 'Unknown Artist',
-                'album': track.parentTitle or 'Unknown Album',
-                'path': filepath,
-                'duration': int(track.duration / 1000) if track.duration else -1  # Convert to seconds
-            }
-            track_data.append(track_info)
+        scheduled = set()
         
-        logger.info(f"Submitted {len(tasks)} download tasks to thread pool")
+        previous = None
+        if incremental and self.index is not None:
+            previous = self.index.get_playlist(playlist.ratingKey)
+
+        # Comparing items with the last sync needs all of them before downloading
+        if tracks is None:
+            tracks = self.fetch_items(playlist) if previous is not None else self.iter_items(playlist)
+
+        if previous is not None:
+            items_hash = _items_hash(playlist, tracks)
+            if previous.items_hash == items_hash:
+                logger.info(f"Items of playlist '{playlist.title}' are unchanged, skipping")
+                self._pending_states[playlist.ratingKey] = PlaylistState(
+                    _timestamp(playlist.updatedAt), playlist.leafCount, items_hash)
+                self._pending_manifests[playlist.ratingKey] = {track.partId for track in tracks}
+                return tasks
+            snapshot = self.index.get_snapshot(playlist.ratingKey)
+            if snapshot is not None and not overwrite:
+                return self._download_delta(playlist, tracks, snapshot, items_hash)
+        digest = _items_digest(playlist)
+        manifest = set()
+        items = []
         
-        # Export playlist file if exporter is available
-        if self.exporter:
-            logger.info(f"Exporting playlist '{playlist.title}' using {type(self.exporter).__name__}")
-            self._export_playlist(playlist, track_data)
-        else:
+        if not self.exporters:
             logger.warning("No exporter configured, skipping playlist export")
+
+        # Playlist files are streamed as tracks are submitted; library
+        # exporters such as iTunes need the whole list at once
+        failed = []
+        outputs = self._open_exports(playlist, failed)
+        library_exporters = [exporter for exporter in self.exporters if exporter.extension is None]
+        track_data: Optional[List[TrackRecord]] = [] if library_exporters else None
+
+        try:
+            # Download tracks
+            for i, track in enumerate(tracks, 1):
+                logger.debug(f"Submitting track {i} for download: {track.title}")
+                digest.update(b"\0" + str(track.ratingKey).encode("ascii"))
+                manifest.add(track.partId)
+                items.append(track.partId)
+                future = self._submit_track(playlist, track, overwrite)
+                if future not in scheduled:
+                    scheduled.add(future)
+                    tasks.append(future)
+                
+                for output in list(outputs):
+                    try:
+                        output.write(track)
+                    except Exception as e:
+                        logger.error(f"Failed to export playlist '{playlist.title}' to {output.path}: {e}")
+                        output.discard()
+                        outputs.remove(output)
+                        failed.append(output.exporter.name)
+                if track_data is not None:
+                    track_data.append(track)
+        except BaseException:
+            for output in outputs:
+                output.discard()
+            raise
+        
+        logger.info(f"Submitted {len(tasks)} download tasks to the download engine")
+        self._pending_states[playlist.ratingKey] = PlaylistState(
+            _timestamp(playlist.updatedAt), playlist.leafCount, digest.hexdigest())
+        self._pending_manifests[playlist.ratingKey] = manifest
+
+        for output in outputs:
+            try:
+                output.close()
+                self.stats.add(f"export.{output.exporter.name}", output.elapsed)
+                logger.info(f"Exported playlist '{playlist.title}' to {os.path.basename(output.path)}")
+            except Exception as e:
+                logger.error(f"Failed to export playlist '{playlist.title}' to {output.path}: {e}")
+                output.discard()
+                failed.append(output.exporter.name)
+
+        for exporter in library_exporters:
+            logger.info(f"Exporting playlist '{playlist.title}' using {type(exporter).__name__}")
+            try:
+                with self.stats.timer(f"export.{exporter.name}"):
+                    exporter.export(track_data, playlist_name=playlist.title, library_path=self.playlists_path)
+                logger.info(f"{type(exporter).__name__} export completed for '{playlist.title}'")
+            except Exception as e:
+                logger.error(f"Failed to export playlist '{playlist.title}': {e}")
+                failed.append(exporter.name)
+
+        self._snapshot(playlist, items, failed)
+        if failed:
+            raise ExportError(failed, tasks)
         
         return tasks
 
-    def _export_playlist(self, playlist: Playlist, track_data: List[Dict[str, Any]]) -> None:
-        """Export playlist in the specified format."""
-        if not self.exporter:
-            logger.error(f"No exporter available for playlist '{playlist.title}'")
+    def _download_delta(self, playlist: "Playlist", tracks: List[TrackRecord], snapshot: PlaylistSnapshot,
+                        items_hash: str) -> List[Future]:
+        """Sync a playlist from the difference between its items and its last export.
+
+        Only added tracks are submitted, along with known ones the index holds
+        no up to date copy of, e.g. after a failed download. When items were
+        only appended, exports are patched with them, otherwise they are
+        written again from the items already in memory.
+        """
+        items = [track.partId for track in tracks]
+        known = set(snapshot.items)
+        current = set(items)
+        delta = PlaylistDelta(sum(1 for part_id in items if part_id not in known), len(known - current))
+        self.deltas[playlist.ratingKey] = delta
+        logger.info(f"Playlist '{playlist.title}' changed by +{delta.added} -{delta.removed} items")
+
+        tasks = []
+        scheduled = set()
+        for track in tracks:
+            if track.partId in known and self._is_indexed(track):
+                continue
+            future = self._submit_track(playlist, track)
+            if future not in scheduled:
+                scheduled.add(future)
+                tasks.append(future)
+        logger.info(f"Submitted {len(tasks)} download tasks to the download engine")
+        self._pending_states[playlist.ratingKey] = PlaylistState(
+            _timestamp(playlist.updatedAt), playlist.leafCount, items_hash)
+        self._pending_manifests[playlist.ratingKey] = current
+
+        count = len(snapshot.items)
+        appended = tracks[count:] if tuple(items[:count]) == snapshot.items else None
+        failed = []
+        for exporter in self.exporters:
+            try:
+                with self.stats.timer(f"export.{exporter.name}"):
+                    patched = (appended is not None and exporter.name in snapshot.formats
+                               and self._append_export(exporter, playlist, appended, count))
+                    if not patched:
+                        self._rewrite_export(exporter, playlist, tracks)
+            except Exception as e:
+                logger.error(f"Failed to export playlist '{playlist.title}' with {type(exporter).__name__}: {e}")
+                failed.append(exporter.name)
+
+        self._snapshot(playlist, items, failed)
+        if failed:
+            raise ExportError(failed, tasks)
+        return tasks
+
+    def _append_export(self, exporter, playlist: "Playlist", tracks: List[TrackRecord], count: int) -> bool:
+        """Append tracks to an existing export of a playlist holding count tracks."""
+        if exporter.extension is None:
+            patched = exporter.append(tracks, count, playlist_name=playlist.title, library_path=self.playlists_path)
+        else:
+            path = os.path.join(self.playlists_path, f"{playlist.title}.{exporter.extension}")
+            patched = os.path.exists(path) and exporter.append(tracks, count, path=path)
+        if patched:
+            logger.info(f"Appended {len(tracks)} tracks to the {exporter.name} export of '{playlist.title}'")
+        return patched
+
+    def _rewrite_export(self, exporter, playlist: "Playlist", tracks: List[TrackRecord]) -> None:
+        """Write one exporter's output of a playlist in full."""
+        if exporter.extension is None:
+            exporter.export(tracks, playlist_name=playlist.title, library_path=self.playlists_path)
             return
-        
-        exporter_type = type(self.exporter).__name__
-        logger.debug(f"Starting export of playlist '{playlist.title}' with {exporter_type}")
-        
+        output = _ExportFile(exporter, os.path.join(self.playlists_path, f"{playlist.title}.{exporter.extension}"))
         try:
-            if exporter_type == 'ITunesExporter':
-                # iTunes exporter handles the library file directly
-                logger.debug(f"Calling iTunes exporter for '{playlist.title}'")
-                self.exporter.export(
-                    track_data, 
-                    playlist_name=playlist.title,
-                    library_path=self.playlists_path
-                )
-                logger.info(f"iTunes export completed for '{playlist.title}'")
-            else:
-                # Other exporters create individual playlist files
-                exporter_extensions = {
-                    'JSONExporter': 'json',
-                    'M3U8Exporter': 'm3u8'
-                }
-                
-                extension = exporter_extensions.get(exporter_type, 'txt')
-                filename = f"{playlist.title}.{extension}"
-                filepath = os.path.join(self.playlists_path, filename)
-                
-                logger.debug(f"Exporting playlist to file: {filepath}")
-                
-                # Export playlist data
-                exported_content = self.exporter.export(track_data)
-                
-                # Write to file
-                with open(filepath, 'w', encoding='utf-8') as f:
-                    f.write(exported_content)
-                
-                logger.info(f"Exported playlist '{playlist.title}' to {filename}")
-        
-        except Exception as e:
-            logger.error(f"Failed to export playlist '{playlist.title}': {e}")
+            for track in tracks:
+                output.write(track)
+            output.close()
+        except BaseException:
+            output.discard()
             raise
+        logger.info(f"Exported playlist '{playlist.title}' to {os.path.basename(output.path)}")
+
+    def _snapshot(self, playlist: "Playlist", items: List[int], failed: List[str]) -> None:
+        """Remember the items a playlist's exports were just written with.
+
+        Formats that failed are left out, so their next export is written in
+        full. The snapshot is saved right away, as the exports on disk already
+        match it even if the run is interrupted before its downloads finish.
+        """
+        if self.index is None:
+            return
+        formats = [exporter.name for exporter in self.exporters if exporter.name not in failed]
+        self.index.put_snapshot(playlist.ratingKey, items, formats)
+        self.index.flush()
 
-    def download_playlist(self, playlist: Playlist, overwrite: bool = False):
+    def flush_exports(self) -> None:
+        """Let exporters that buffer across playlists write their output once."""
+        failed = []
+        for exporter in self.exporters:
+            # Playlist file exporters write as they go, leaving nothing to flush
+            if exporter.extension is not None:
+                continue
+            try:
+                with self.stats.timer(f"flush.{exporter.name}"):
+                    exporter.flush()
+            except Exception as e:
+                logger.error(f"Failed to flush {type(exporter).__name__}: {e}")
+                failed.append(exporter.name)
+
+        if failed:
+            raise RuntimeError(f"Export failed for format(s): {', '.join(failed)}")
+
+    def _open_exports(self, playlist: "Playlist", failed: List[str]) -> List["_ExportFile"]:
+        """Open the output file of every exporter that writes one file per playlist."""
+        outputs = []
+        for exporter in self.exporters:
+            if exporter.extension is None:
+                continue
+            filepath = os.path.join(self.playlists_path, f"{playlist.title}.{exporter.extension}")
+            logger.debug(f"Exporting playlist to file: {filepath}")
+            try:
+                outputs.append(_ExportFile(exporter, filepath))
+            except Exception as e:
+                logger.error(f"Failed to export playlist '{playlist.title}': {e}")
+                failed.append(exporter.name)
+        return outputs
+
+    def download_playlist(self, playlist: "Playlist", overwrite: bool = False):
         """Download all tracks in a playlist (legacy method for backwards compatibility)."""
         logger.debug(f"Legacy download_playlist called for '{playlist.title}'")
         return self.download(playlist, overwrite)
+
+
+class _ExportFile:
+    """One exporter's output for one playlist, streamed to a temp file and moved into place on close."""
+
+    def __init__(self, exporter, path: str) -> None:
+        start = time.perf_counter()
+        self.exporter = exporter
+        self.path = path
+        self.temp_path = path + ".tmp"
+        self.count = 0
+        self.file = open(self.temp_path, "w", encoding="utf-8", buffering=WRITE_BUFFER_SIZE)
+        exporter.begin(self.file)
+        # Time spent in the exporter, spread over the whole playlist
+        self.elapsed = time.perf_counter() - start
+
+    def write(self, track: TrackRecord) -> None:
+        start = time.perf_counter()
+        self.exporter.write_track(self.file, track, self.count)
+        self.count += 1
+        self.elapsed += time.perf_counter() - start
+
+    def close(self) -> None:
+        start = time.perf_counter()
+        self.exporter.end(self.file, self.count)
+        self.file.close()
+        os.replace(self.temp_path, self.path)
+        self.elapsed += time.perf_counter() - start
+
+    def discard(self) -> None:
+        self.file.close()
+        try:
+            os.remove(self.temp_path)
+        except OSError:
+            pass
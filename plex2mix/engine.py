@@ -0,0 +1,212 @@
+import heapq
+import asyncio
+import logging
+import itertools
+import threading
+from concurrent.futures import Future, wait
+from typing import Any, Collection, List, Set
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Priority of work that must run before any queued download
+URGENT = (0,)
+# Seconds allowed to connect to the server and between two reads of a response.
+# There is no overall limit, a large file on a slow link may take a long time.
+CONNECT_TIMEOUT = 30
+READ_TIMEOUT = 60
+
+
+class ThreadEngine:
+    """Runs each download on a pool of worker threads.
+
+    Queued downloads are started in priority order, lowest first, and in
+    submission order among equal priorities. promote() moves the queued
+    downloads of given tags, e.g. playlists, ahead of everything else.
+    """
+
+    asynchronous = False
+
+    def __init__(self, threads: int = 4) -> None:
+        self._queue: List[list] = []
+        self._condition = threading.Condition()
+        self._counter = itertools.count()
+        self._shutdown = False
+        self._threads = [
+            threading.Thread(target=self._work, name=f"plex2mix-download-{i}", daemon=True)
+            for i in range(threads)
+        ]
+        for thread in self._threads:
+            thread.start()
+        logger.info(f"Initialized thread engine with {threads} threads")
+
+    def submit(self, fn, *args, priority: tuple = (), tag: Any = None) -> Future:
+        """Schedule fn(*args) on a worker thread."""
+        future = Future()
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError("cannot schedule new downloads after shutdown")
+            heapq.heappush(self._queue, [priority, next(self._counter), tag, future, fn, args])
+            self._condition.notify()
+        return future
+
+    def promote(self, tags: Collection[Any]) -> int:
+        """Run the queued downloads of the given tags before all others. Returns how many moved."""
+        with self._condition:
+            moved = _promote(self._queue, tags)
+        return moved
+
+    def pending(self) -> int:
+        """Number of downloads waiting for a worker thread."""
+        with self._condition:
+            return len(self._queue)
+
+    def _work(self) -> None:
+        while True:
+            with self._condition:
+                while not self._queue and not self._shutdown:
+                    self._condition.wait()
+                if not self._queue:
+                    return
+                _, _, _, future, fn, args = heapq.heappop(self._queue)
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = fn(*args)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+    def shutdown(self) -> None:
+        """Wait for running and queued downloads and release the threads."""
+        with self._condition:
+            self._shutdown = True
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join()
+
+
+class AsyncEngine:
+    """Runs downloads as coroutines sharing one keep-alive HTTP session.
+
+    An event loop runs in a background thread so callers keep receiving plain
+    concurrent.futures.Future objects, exactly like with ThreadEngine. At most
+    `concurrency` downloads are in flight at once, all multiplexed over a single
+    aiohttp connection pool instead of one OS thread per download. Downloads
+    waiting for a slot get it in priority order, like with ThreadEngine.
+    """
+
+    asynchronous = True
+
+    def __init__(self, concurrency: int = 32) -> None:
+        try:
+            import aiohttp
+        except ImportError as e:
+            raise ImportError("The async engine requires aiohttp (pip install 'plex2mix[async]')") from e
+
+        self.concurrency = concurrency
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="plex2mix-async", daemon=True)
+        self._thread.start()
+
+        async def _open():
+            connector = aiohttp.TCPConnector(limit=concurrency)
+            timeout = aiohttp.ClientTimeout(total=None, sock_connect=CONNECT_TIMEOUT, sock_read=READ_TIMEOUT)
+            return aiohttp.ClientSession(connector=connector, timeout=timeout), _PriorityGate(concurrency)
+
+        self.session, self._gate = asyncio.run_coroutine_threadsafe(_open(), self.loop).result()
+        self._futures: Set[Future] = set()
+        self._lock = threading.Lock()
+        self._shutdown = False
+        logger.info(f"Initialized async engine with {concurrency} concurrent downloads")
+
+    async def _bounded(self, coro_fn, args, priority: tuple, tag: Any):
+        await self._gate.acquire(priority, tag)
+        try:
+            return await coro_fn(*args)
+        finally:
+            self._gate.release()
+
+    def submit(self, coro_fn, *args, priority: tuple = (), tag: Any = None) -> Future:
+        """Schedule the coroutine coro_fn(*args) on the engine's event loop."""
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError("cannot schedule new downloads after shutdown")
+            future = asyncio.run_coroutine_threadsafe(self._bounded(coro_fn, args, priority, tag), self.loop)
+            self._futures.add(future)
+        future.add_done_callback(self._discard)
+        return future
+
+    def _discard(self, future: Future) -> None:
+        with self._lock:
+            self._futures.discard(future)
+
+    def promote(self, tags: Collection[Any]) -> int:
+        """Run the waiting downloads of the given tags before all others. Returns how many moved."""
+        async def _promote_waiting():
+            return self._gate.promote(tags)
+        return asyncio.run_coroutine_threadsafe(_promote_waiting(), self.loop).result()
+
+    def pending(self) -> int:
+        """Number of downloads waiting for a slot."""
+        return len(self._gate.waiters)
+
+    def shutdown(self) -> None:
+        """Wait for running and queued downloads, then close the HTTP session and stop the event loop."""
+        with self._lock:
+            if self._shutdown:
+                return
+            self._shutdown = True
+            futures = list(self._futures)
+        wait(futures)
+        asyncio.run_coroutine_threadsafe(self.session.close(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
+
+
+class _PriorityGate:
+    """Semaphore of the async engine handing free slots to the waiter with the lowest priority."""
+
+    def __init__(self, slots: int) -> None:
+        self.free = slots
+        self.waiters: List[list] = []
+        self._counter = itertools.count()
+
+    async def acquire(self, priority: tuple, tag: Any) -> None:
+        if self.free and not self.waiters:
+            self.free -= 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.waiters, [priority, next(self._counter), tag, waiter])
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            # The slot may have been handed over just before the cancellation
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+
+    def release(self) -> None:
+        while self.waiters:
+            waiter = heapq.heappop(self.waiters)[3]
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.free += 1
+
+    def promote(self, tags: Collection[Any]) -> int:
+        return _promote(self.waiters, tags)
+
+
+def _promote(heap: List[list], tags: Collection[Any]) -> int:
+    """Give the heap entries of the given tags URGENT priority, keeping their order."""
+    moved = 0
+    for entry in heap:
+        if entry[2] in tags and entry[0][:1] != URGENT:
+            entry[0] = URGENT + tuple(entry[0])
+            moved += 1
+    if moved:
+        heapq.heapify(heap)
+    return moved
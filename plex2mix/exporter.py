@@ -1,66 +1,175 @@
+import re
+import sys
+import io
 import json
 import os
+import base64
 import logging
-from xml.etree.ElementTree import Element, SubElement, tostring, parse, ParseError
-from xml.dom import minidom
-from typing import List, Dict, Any, Optional
+import plistlib
+from datetime import datetime
+from xml.etree.ElementTree import iterparse, ParseError
+from xml.sax.saxutils import escape
+from typing import List, Dict, Any, Iterable, Optional, TextIO
+
+from plex2mix.records import TrackRecord
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
+WRITE_BUFFER_SIZE = 1024 * 1024
+PLIST_FORMATS = ("xml", "binary")
+
 
 class BaseExporter:
-    """Base class for all exporters."""
+    """Base class for all exporters.
+
+    Exporters that write one file per playlist stream it track by track:
+    begin(), write_track() for each track, then end(). Exporters with no
+    extension maintain their own output and only implement export().
+    Either kind can implement append() to add tracks to the end of an
+    existing export without writing it again.
+    """
+
+    # File extension of the per-playlist output, None for library exporters
+    extension: Optional[str] = None
     
     @property
     def name(self) -> str:
         """Return the name of the exporter."""
         return self.__class__.__name__.replace('Exporter', '').lower()
     
-    def export(self, data: List[Dict[str, Any]], **kwargs) -> str:
-        raise NotImplementedError("Exporter must implement export method")
+    def export(self, data: List[TrackRecord], **kwargs) -> str:
+        """Return the whole export of data as a string."""
+        logger.debug(f"{self.name.upper()} Export: Exporting {len(data)} tracks")
+        buffer = io.StringIO()
+        self.write(data, buffer)
+        logger.info(f"{self.name.upper()} Export: Successfully exported {len(data)} tracks")
+        return buffer.getvalue()
+
+    def write(self, tracks: Iterable[TrackRecord], f: TextIO) -> int:
+        """Stream tracks to the file handle f and return how many were written."""
+        count = 0
+        self.begin(f)
+        for track in tracks:
+            self.write_track(f, track, count)
+            count += 1
+        self.end(f, count)
+        return count
+
+    def begin(self, f: TextIO) -> None:
+        pass
+
+    def write_track(self, f: TextIO, track: TrackRecord, index: int) -> None:
+        raise NotImplementedError("Exporter must implement write_track method")
+
+    def end(self, f: TextIO, count: int) -> None:
+        pass
+
+    def append(self, tracks: List[TrackRecord], count: int, **kwargs) -> bool:
+        """Add tracks after the count tracks an existing export already holds.
+
+        Per-playlist exporters get the file as path, library exporters the same
+        keyword arguments as export(). Returns False when the export cannot be
+        patched in place, and the caller then writes it again in full.
+        """
+        return False
+
+    def flush(self) -> None:
+        """Write out any state kept across playlists. Called once at the end of a run."""
+        pass
 
 
 class JSONExporter(BaseExporter):
-    def export(self, data: List[Dict[str, Any]], **kwargs) -> str:
-        logger.debug(f"JSON Export: Exporting {len(data)} tracks")
-        result = json.dumps(data, indent=2, ensure_ascii=False)
-        logger.info(f"JSON Export: Successfully exported {len(data)} tracks")
-        return result
+    """Writes a JSON array of tracks, or one JSON object per line with lines set."""
+
+    def __init__(self, lines: bool = False):
+        self.lines = lines
+        self.extension = "jsonl" if lines else "json"
+
+    @property
+    def name(self) -> str:
+        """Return the name of the exporter, telling JSON arrays and JSON Lines apart."""
+        return self.extension
+
+    def begin(self, f: TextIO) -> None:
+        if not self.lines:
+            f.write("[")
+
+    def write_track(self, f: TextIO, track: TrackRecord, index: int) -> None:
+        if self.lines:
+            f.write(json.dumps(track.to_dict(), ensure_ascii=False))
+            f.write("\n")
+        else:
+            # Same layout as json.dumps(tracks, indent=2)
+            f.write("\n  " if index == 0 else ",\n  ")
+            f.write(json.dumps(track.to_dict(), indent=2, ensure_ascii=False).replace("\n", "\n  "))
+
+    def end(self, f: TextIO, count: int) -> None:
+        if not self.lines:
+            f.write("\n]" if count else "]")
+
+    def append(self, tracks: List[TrackRecord], count: int, path: str = None, **kwargs) -> bool:
+        # Only the closing bracket of an array is rewritten
+        tail = b"" if self.lines else (b"\n]" if count else b"]")
+        with open(path, "rb+") as raw:
+            raw.seek(0, os.SEEK_END)
+            if raw.tell() < len(tail):
+                return False
+            raw.seek(-len(tail), os.SEEK_END)
+            if raw.read() != tail:
+                return False
+            raw.seek(-len(tail), os.SEEK_END)
+            raw.truncate()
+            f = io.TextIOWrapper(raw, encoding="utf-8")
+            for index, track in enumerate(tracks, count):
+                self.write_track(f, track, index)
+            self.end(f, count + len(tracks))
+            f.flush()
+            f.detach()
+        return True
 
 
 class M3U8Exporter(BaseExporter):
-    def export(self, data: List[Dict[str, Any]], **kwargs) -> str:
-        """
-        Expects data as a list of dicts with at least a 'path' key.
-        Returns an M3U8 playlist string.
-        """
-        logger.debug(f"M3U8 Export: Exporting {len(data)} tracks")
-        
-        lines = ["#EXTM3U"]
-        for item in data:
-            title = item.get("title", "Unknown")
-            artist = item.get("artist", "")
-            duration = item.get("duration", -1)
-            path = item["path"]
-            
-            display_title = f"{artist} - {title}" if artist and artist != "Unknown Artist" else title
-            lines.append(f"#EXTINF:{duration},{display_title}")
-            lines.append(path)
-        
-        result = "\n".join(lines)
-        logger.info(f"M3U8 Export: Successfully exported {len(data)} tracks")
-        return result
+    """Writes an extended M3U8 playlist."""
+
+    extension = "m3u8"
+
+    def begin(self, f: TextIO) -> None:
+        f.write("#EXTM3U")
+
+    def write_track(self, f: TextIO, track: TrackRecord, index: int) -> None:
+        title, artist = track.title, track.artist
+        display_title = f"{artist} - {title}" if artist and artist != "Unknown Artist" else title
+        f.write(f"\n#EXTINF:{track.seconds},{display_title}\n{track.path}")
+
+    def append(self, tracks: List[TrackRecord], count: int, path: str = None, **kwargs) -> bool:
+        with open(path, "a", encoding="utf-8") as f:
+            for index, track in enumerate(tracks, count):
+                self.write_track(f, track, index)
+        return True
 
 
 class ITunesExporter(BaseExporter):
-    def __init__(self):
-        self.library_file = "iTunes Library.xml"
+    def __init__(self, plist_format: str = "xml"):
+        if plist_format not in PLIST_FORMATS:
+            raise ValueError(f"Unknown iTunes library format: {plist_format}")
+        # Named after the format, as tools pick a parser from the extension
+        self.library_file = "iTunes Library.plist" if plist_format == "binary" else "iTunes Library.xml"
+        self.plist_format = plist_format
         self.track_id_counter = 1
+        # The library is loaded once per run, updated in memory and saved by flush()
+        self._library_file_path = None
+        self._header: Dict[str, Any] = {}
+        self._tracks: Dict[int, Dict[str, Any]] = {}
+        self._playlists: List[Dict[str, Any]] = []
+        self._locations: Dict[str, int] = {}
+        self._playlist_index: Dict[str, Dict[str, Any]] = {}
+        self._dirty = False
         
-    def export(self, data: List[Dict[str, Any]], playlist_name: str = None, library_path: str = None, **kwargs) -> str:
+    def export(self, data: List[TrackRecord], playlist_name: str = None, library_path: str = None, **kwargs) -> str:
         """
         Maintains a single iTunes library file and adds/updates playlists.
+        Changes are kept in memory until flush() is called.
         """
         if not library_path:
             raise ValueError("library_path is required for iTunes export")
@@ -69,140 +178,182 @@ class ITunesExporter(BaseExporter):
         logger.info(f"iTunes Export: Processing playlist '{playlist_name}' with {len(data)} tracks")
         logger.debug(f"iTunes Export: Library file: {library_file_path}")
         
-        # Load existing library or create new one
-        plist, tracks_dict, playlists_array = self._load_or_create_library(library_file_path)
+        self._open_library(library_file_path)
         
         # Add tracks to library and get their IDs
-        track_ids = self._add_tracks_to_library(tracks_dict, data)
+        track_ids = self._add_tracks_to_library(data)
         
         # Add or update playlist
         if playlist_name:
-            self._add_or_update_playlist(playlists_array, playlist_name, track_ids)
-        
-        # Save library
-        self._save_library(library_file_path, plist)
+            self._add_or_update_playlist(playlist_name, track_ids)
         
+        self._dirty = True
         logger.info(f"iTunes Export: Successfully updated iTunes library")
         return f"Updated iTunes library at {library_file_path}"
+
+    def append(self, tracks: List[TrackRecord], count: int, playlist_name: str = None,
+               library_path: str = None, **kwargs) -> bool:
+        """Add tracks to the end of a playlist already in the library, in memory."""
+        if not library_path or not playlist_name:
+            return False
+        self._open_library(os.path.join(library_path, self.library_file))
+        playlist = self._playlist_index.get(playlist_name)
+        items = playlist.get('Playlist Items') if playlist is not None else None
+        if not isinstance(items, list) or len(items) != count:
+            return False
+
+        items.extend({'Track ID': track_id} for track_id in self._add_tracks_to_library(tracks))
+        self._dirty = True
+        logger.info(f"iTunes Export: Appended {len(tracks)} tracks to playlist '{playlist_name}'")
+        return True
+
+    def _open_library(self, library_file_path: str) -> None:
+        """Load the existing library or create a new one, once per run."""
+        if library_file_path != self._library_file_path:
+            self.flush()
+            self._load_or_create_library(library_file_path)
+            self._library_file_path = library_file_path
+
+    def flush(self) -> None:
+        """Save the library once all playlists of the run have been added.
+
+        The in-memory copy is then dropped, so the next run of a long-lived
+        process reads the file again instead of overwriting it from stale state.
+        """
+        if self._dirty:
+            self._save_library(self._library_file_path)
+            self._dirty = False
+        self._library_file_path = None
+        self._header = {}
+        self._tracks = {}
+        self._playlists = []
+        self._locations = {}
+        self._playlist_index = {}
     
-    def _load_or_create_library(self, library_file_path: str) -> tuple:
-        """Load existing iTunes library or create a new one."""
+    def _load_or_create_library(self, library_file_path: str) -> None:
+        """Load existing iTunes library or create a new one, and index it."""
         if os.path.exists(library_file_path):
             logger.debug(f"iTunes Export: Loading existing library from {library_file_path}")
             try:
-                tree = parse(library_file_path)
-                plist = tree.getroot()
-                
-                # Find tracks dict and playlists array
-                dict_root = plist.find('dict')
-                tracks_dict = None
-                playlists_array = None
-                
-                # Navigate through key-value pairs
-                children = list(dict_root)
-                for i in range(0, len(children), 2):  # Keys and values come in pairs
-                    if i + 1 < len(children):
-                        key = children[i]
-                        value = children[i + 1]
-                        
-                        if key.tag == 'key' and key.text == 'Tracks' and value.tag == 'dict':
-                            tracks_dict = value
-                        elif key.tag == 'key' and key.text == 'Playlists' and value.tag == 'array':
-                            playlists_array = value
-                
-                # Get highest track ID for counter
-                existing_track_count = 0
-                if tracks_dict is not None:
-                    track_children = list(tracks_dict)
-                    track_keys = []
-                    for i in range(0, len(track_children), 2):
-                        if i + 1 < len(track_children):
-                            key = track_children[i]
-                            if key.tag == 'key' and key.text.isdigit():
-                                track_keys.append(int(key.text))
-                    
-                    existing_track_count = len(track_keys)
-                    if track_keys:
-                        self.track_id_counter = max(track_keys) + 1
-                
-                existing_playlist_count = len(playlists_array.findall('dict')) if playlists_array is not None else 0
-                logger.debug(f"iTunes Export: Found {existing_track_count} existing tracks, {existing_playlist_count} existing playlists")
+                self._header, self._tracks, self._playlists = self._read_library(library_file_path)
+                self._index_library()
+                logger.debug(f"iTunes Export: Found {len(self._locations)} existing tracks, {len(self._playlists)} existing playlists")
                 logger.debug(f"iTunes Export: Next track ID will be {self.track_id_counter}")
-                
-                return plist, tracks_dict, playlists_array
-                
-            except (ParseError, AttributeError) as e:
+                return
+            except (ParseError, plistlib.InvalidFileException, ValueError) as e:
                 logger.warning(f"iTunes Export: Error parsing existing library: {e}")
                 logger.info(f"iTunes Export: Creating new library")
         else:
             logger.debug(f"iTunes Export: No existing library found, creating new one")
         
         # Create new library
-        return self._create_new_library()
+        self._create_new_library()
+
+    def _read_library(self, library_file_path: str) -> tuple:
+        """Stream the library file into plain header, tracks and playlists structures.
+
+        Each track and playlist is converted as soon as its element is complete
+        and then cleared, so only one entry's elements are held at a time.
+        """
+        with open(library_file_path, 'rb') as f:
+            binary = f.read(8) == b'bplist00'
+        if binary:
+            return self._read_binary_library(library_file_path)
+
+        header: Dict[str, Any] = {}
+        tracks: Dict[int, Dict[str, Any]] = {}
+        playlists: List[Dict[str, Any]] = []
+
+        depth = 0
+        root_dict = None
+        root_key = None
+        container = None
+        entry_key = None
+
+        for event, elem in iterparse(library_file_path, events=('start', 'end')):
+            if event == 'start':
+                depth += 1
+                if depth == 2 and elem.tag == 'dict':
+                    root_dict = elem
+                elif depth == 3 and (root_key, elem.tag) in (('Tracks', 'dict'), ('Playlists', 'array')):
+                    container = elem
+                continue
+
+            if depth == 4 and container is not None:
+                # A complete child of the Tracks dict or the Playlists array
+                if elem.tag == 'key':
+                    entry_key = elem.text
+                elif container.tag == 'array':
+                    playlists.append(_plist_value(elem))
+                elif entry_key and entry_key.isdigit() and elem.tag == 'dict':
+                    tracks[int(entry_key)] = _plist_value(elem)
+                container.clear()
+            elif depth == 3 and root_dict is not None:
+                if elem.tag == 'key':
+                    root_key = elem.text
+                elif elem is container:
+                    container = None
+                elif root_key is not None:
+                    header[root_key] = _plist_value(elem)
+                root_dict.remove(elem)
+            depth -= 1
+
+        if root_dict is None:
+            raise ValueError("no top-level dict in library")
+        return header, tracks, playlists
+
+    def _read_binary_library(self, library_file_path: str) -> tuple:
+        """Load a binary plist library, which cannot be streamed."""
+        with open(library_file_path, 'rb') as f:
+            header = plistlib.load(f)
+        if not isinstance(header, dict):
+            raise ValueError("no top-level dict in library")
+        tracks = {int(key): track for key, track in header.pop('Tracks', {}).items() if key.isdigit()}
+        playlists = header.pop('Playlists', [])
+        return header, tracks, playlists
+
+    def _index_library(self) -> None:
+        """Map track Locations to track IDs and playlist names to playlists."""
+        self._locations = {}
+        for track_id, track in self._tracks.items():
+            location = track.get('Location')
+            if isinstance(location, str):
+                self._locations[location.replace('file://', '')] = track_id
+        self.track_id_counter = max(self._tracks) + 1 if self._tracks else 1
+
+        self._playlist_index = {}
+        for playlist in self._playlists:
+            name = playlist.get('Name')
+            if isinstance(name, str):
+                # Keep the first playlist of a given name, like a linear search would
+                self._playlist_index.setdefault(name, playlist)
     
-    def _create_new_library(self) -> tuple:
+    def _create_new_library(self) -> None:
         """Create a new iTunes library structure."""
         logger.debug(f"iTunes Export: Creating new iTunes library structure")
-        plist = Element('plist', version="1.0")
-        dict_root = SubElement(plist, 'dict')
-        
-        # Major Version
-        SubElement(dict_root, 'key').text = 'Major Version'
-        SubElement(dict_root, 'integer').text = '1'
-        
-        # Minor Version
-        SubElement(dict_root, 'key').text = 'Minor Version'
-        SubElement(dict_root, 'integer').text = '1'
-        
-        # Application Version
-        SubElement(dict_root, 'key').text = 'Application Version'
-        SubElement(dict_root, 'string').text = 'plex2mix'
-        
-        # Tracks
-        SubElement(dict_root, 'key').text = 'Tracks'
-        tracks_dict = SubElement(dict_root, 'dict')
-        
-        # Playlists
-        SubElement(dict_root, 'key').text = 'Playlists'
-        playlists_array = SubElement(dict_root, 'array')
-        
-        return plist, tracks_dict, playlists_array
+        self._header = {
+            'Major Version': 1,
+            'Minor Version': 1,
+            'Application Version': 'plex2mix',
+        }
+        self._tracks = {}
+        self._playlists = []
+        self._index_library()
     
-    def _add_tracks_to_library(self, tracks_dict: Element, data: List[Dict[str, Any]]) -> List[int]:
+    def _add_tracks_to_library(self, data: List[TrackRecord]) -> List[int]:
         """Add tracks to the library and return their track IDs."""
         track_ids = []
         
-        # Create a map of existing tracks (by file path) to avoid duplicates
-        existing_tracks = {}
-        if tracks_dict is not None:
-            children = list(tracks_dict)
-            for i in range(0, len(children), 2):  # Keys and values come in pairs
-                if i + 1 < len(children):
-                    key_elem = children[i]
-                    track_dict = children[i + 1]
-                    
-                    if key_elem.tag == 'key' and track_dict.tag == 'dict':
-                        track_id = key_elem.text
-                        if track_id.isdigit():
-                            # Find Location in track_dict
-                            track_children = list(track_dict)
-                            for j in range(0, len(track_children), 2):
-                                if j + 1 < len(track_children):
-                                    track_key = track_children[j]
-                                    track_value = track_children[j + 1]
-                                    if track_key.tag == 'key' and track_key.text == 'Location' and track_value.tag == 'string':
-                                        path = track_value.text.replace('file://', '') if track_value.text else ''
-                                        existing_tracks[path] = int(track_id)
-                                        break
-        
-        logger.debug(f"iTunes Export: Found {len(existing_tracks)} existing tracks in library")
+        # Existing tracks (by file path) are indexed once when the library is loaded
+        existing_tracks = self._locations
+        logger.debug(f"iTunes Export: Library has {len(existing_tracks)} indexed tracks")
         
         new_tracks_added = 0
         existing_tracks_reused = 0
         
         for track in data:
-            track_path = track.get('path', '')
-            track_title = track.get('title', 'Unknown')
+            track_path = track.path
+            track_title = track.title or 'Unknown'
             
             # Check if track already exists
             if track_path in existing_tracks:
@@ -216,264 +367,186 @@ class ITunesExporter(BaseExporter):
             track_id = self.track_id_counter
             self.track_id_counter += 1
             track_ids.append(track_id)
+            existing_tracks[track_path] = track_id
             new_tracks_added += 1
             
             logger.debug(f"iTunes Export: Adding new track ID {track_id} for '{track_title}'")
             
-            # Track ID as key
-            SubElement(tracks_dict, 'key').text = str(track_id)
-            
-            # Track data
-            track_dict = SubElement(tracks_dict, 'dict')
-            
-            SubElement(track_dict, 'key').text = 'Track ID'
-            SubElement(track_dict, 'integer').text = str(track_id)
-            
-            SubElement(track_dict, 'key').text = 'Name'
-            SubElement(track_dict, 'string').text = track.get('title', '')
-            
-            SubElement(track_dict, 'key').text = 'Artist'
-            SubElement(track_dict, 'string').text = track.get('artist', '')
-            
-            SubElement(track_dict, 'key').text = 'Album'
-            SubElement(track_dict, 'string').text = track.get('album', '')
-            
-            SubElement(track_dict, 'key').text = 'Location'
-            SubElement(track_dict, 'string').text = f"file://{track_path}"
-            
-            if track.get('duration', -1) > 0:
-                SubElement(track_dict, 'key').text = 'Total Time'
-                SubElement(track_dict, 'integer').text = str(track['duration'] * 1000)  # iTunes uses milliseconds
+            track_dict = {
+                'Track ID': track_id,
+                'Name': track.title or '',
+                'Artist': track.artist,
+                'Album': track.album,
+                'Location': f"file://{track_path}",
+            }
+            if track.seconds > 0:
+                track_dict['Total Time'] = track.seconds * 1000  # iTunes uses milliseconds
+            self._tracks[track_id] = track_dict
         
         logger.info(f"iTunes Export: Added {new_tracks_added} new tracks, reused {existing_tracks_reused} existing tracks")
         return track_ids
     
-    def _add_or_update_playlist(self, playlists_array: Element, playlist_name: str, track_ids: List[int]):
+    def _add_or_update_playlist(self, playlist_name: str, track_ids: List[int]):
         """Add or update a playlist in the library."""
         logger.debug(f"iTunes Export: Processing playlist '{playlist_name}' with {len(track_ids)} tracks")
         
         # Check if playlist already exists
-        existing_playlist = None
-        playlist_index = -1
-        for i, playlist_dict in enumerate(playlists_array.findall('dict')):
-            # Look for the playlist name
-            children = list(playlist_dict)
-            for j in range(0, len(children), 2):
-                if j + 1 < len(children):
-                    key_elem = children[j]
-                    value_elem = children[j + 1]
-                    if (key_elem.tag == 'key' and key_elem.text == 'Name' and 
-                        value_elem.tag == 'string' and value_elem.text == playlist_name):
-                        existing_playlist = playlist_dict
-                        playlist_index = i
-                        break
-            if existing_playlist is not None:
-                break
+        existing_playlist = self._playlist_index.get(playlist_name)
         
         if existing_playlist is not None:
-            logger.debug(f"iTunes Export: Updating existing playlist '{playlist_name}' (index {playlist_index})")
-            
-            # Count existing tracks in playlist and remove old items
-            old_track_count = 0
-            children = list(existing_playlist)
-            items_to_remove = []
-            
-            for j in range(0, len(children), 2):
-                if j + 1 < len(children):
-                    key_elem = children[j]
-                    value_elem = children[j + 1]
-                    if key_elem.tag == 'key' and key_elem.text == 'Playlist Items' and value_elem.tag == 'array':
-                        old_track_count = len(value_elem.findall('dict'))
-                        items_to_remove = [key_elem, value_elem]
-                        break
-            
+            logger.debug(f"iTunes Export: Updating existing playlist '{playlist_name}'")
+            old_items = existing_playlist.pop('Playlist Items', None)
+            old_track_count = len(old_items) if isinstance(old_items, list) else 0
             logger.debug(f"iTunes Export: Playlist had {old_track_count} tracks, now will have {len(track_ids)} tracks")
-            
-            # Remove old track items
-            for item in items_to_remove:
-                existing_playlist.remove(item)
         else:
             logger.debug(f"iTunes Export: Creating new playlist '{playlist_name}'")
-            # Create new playlist
-            existing_playlist = SubElement(playlists_array, 'dict')
-            
-            SubElement(existing_playlist, 'key').text = 'Name'
-            SubElement(existing_playlist, 'string').text = playlist_name
-            
-            playlist_id = len(playlists_array.findall('dict'))
-            SubElement(existing_playlist, 'key').text = 'Playlist ID'
-            SubElement(existing_playlist, 'integer').text = str(playlist_id)
+            playlist_id = len(self._playlists) + 1
+            existing_playlist = {'Name': playlist_name, 'Playlist ID': playlist_id}
+            self._playlists.append(existing_playlist)
+            self._playlist_index[playlist_name] = existing_playlist
             logger.debug(f"iTunes Export: Assigned playlist ID {playlist_id}")
         
         # Add track items
-        SubElement(existing_playlist, 'key').text = 'Playlist Items'
-        items_array = SubElement(existing_playlist, 'array')
-        
-        for i, track_id in enumerate(track_ids):
-            item_dict = SubElement(items_array, 'dict')
-            SubElement(item_dict, 'key').text = 'Track ID'
-            SubElement(item_dict, 'integer').text = str(track_id)
+        existing_playlist['Playlist Items'] = [{'Track ID': track_id} for track_id in track_ids]
         
         logger.info(f"iTunes Export: Successfully added {len(track_ids)} track references to playlist '{playlist_name}'")
     
-    def _save_library(self, library_file_path: str, plist: Element):
-        """Save the iTunes library to file with consistent formatting."""
-        logger.debug(f"iTunes Export: Saving library to {library_file_path}")
-        
-        # Count final stats
-        dict_root = plist.find('dict')
-        total_tracks = 0
-        total_playlists = 0
-        
-        if dict_root is not None:
-            children = list(dict_root)
-            for i in range(0, len(children), 2):
-                if i + 1 < len(children):
-                    key = children[i]
-                    value = children[i + 1]
-                    
-                    if key.tag == 'key' and key.text == 'Tracks' and value.tag == 'dict':
-                        track_children = list(value)
-                        total_tracks = len([k for k in track_children[::2] if k.tag == 'key' and k.text.isdigit()])
-                    elif key.tag == 'key' and key.text == 'Playlists' and value.tag == 'array':
-                        total_playlists = len(value.findall('dict'))
+    def _save_library(self, library_file_path: str):
+        """Save the iTunes library to file, replacing the old one atomically."""
+        logger.debug(f"iTunes Export: Saving library to {library_file_path} ({self.plist_format})")
         
+        total_tracks = len(self._tracks)
+        total_playlists = len(self._playlists)
         logger.debug(f"iTunes Export: Final library contains {total_tracks} tracks and {total_playlists} playlists")
         
-        # Write XML manually with consistent formatting
+        temp_file_path = library_file_path + ".tmp"
         try:
-            with open(library_file_path, 'w', encoding='utf-8') as f:
-                f.write('<?xml version="1.0" ?>\n')
-                f.write('<plist version="1.0">\n')
-                f.write('  <dict>\n')
-                
-                # Write library metadata
-                children = list(dict_root)
-                for i in range(0, len(children), 2):
-                    if i + 1 < len(children):
-                        key = children[i]
-                        value = children[i + 1]
-                        
-                        if key.tag == 'key' and key.text in ['Major Version', 'Minor Version', 'Application Version']:
-                            f.write(f'    <key>{key.text}</key>\n')
-                            if value.tag == 'integer':
-                                f.write(f'    <integer>{value.text}</integer>\n')
-                            elif value.tag == 'string':
-                                f.write(f'    <string>{value.text}</string>\n')
-                
-                # Write tracks section
-                f.write('    <key>Tracks</key>\n')
-                f.write('    <dict>\n')
-                
-                for i in range(0, len(children), 2):
-                    if i + 1 < len(children):
-                        key = children[i]
-                        value = children[i + 1]
-                        
-                        if key.tag == 'key' and key.text == 'Tracks' and value.tag == 'dict':
-                            track_children = list(value)
-                            for j in range(0, len(track_children), 2):
-                                if j + 1 < len(track_children):
-                                    track_key = track_children[j]
-                                    track_dict = track_children[j + 1]
-                                    
-                                    if track_key.tag == 'key' and track_dict.tag == 'dict':
-                                        f.write(f'      <key>{track_key.text}</key>\n')
-                                        f.write('      <dict>\n')
-                                        
-                                        # Write track data
-                                        track_data = list(track_dict)
-                                        for k in range(0, len(track_data), 2):
-                                            if k + 1 < len(track_data):
-                                                data_key = track_data[k]
-                                                data_value = track_data[k + 1]
-                                                
-                                                if data_key.tag == 'key':
-                                                    f.write(f'        <key>{data_key.text}</key>\n')
-                                                    if data_value.tag == 'integer':
-                                                        f.write(f'        <integer>{data_value.text}</integer>\n')
-                                                    elif data_value.tag == 'string':
-                                                        # Escape XML characters
-                                                        escaped_text = data_value.text.replace('&', '&amp;') if data_value.text else ''
-                                                        f.write(f'        <string>{escaped_text}</string>\n')
-                                        
-                                        f.write('      </dict>\n')
-                            break
-                
-                f.write('    </dict>\n')
-                
-                # Write playlists section
-                f.write('    <key>Playlists</key>\n')
-                f.write('    <array>\n')
-                
-                for i in range(0, len(children), 2):
-                    if i + 1 < len(children):
-                        key = children[i]
-                        value = children[i + 1]
-                        
-                        if key.tag == 'key' and key.text == 'Playlists' and value.tag == 'array':
-                            for playlist_dict in value.findall('dict'):
-                                f.write('      <dict>\n')
-                                
-                                # Write playlist data
-                                playlist_data = list(playlist_dict)
-                                for j in range(0, len(playlist_data), 2):
-                                    if j + 1 < len(playlist_data):
-                                        playlist_key = playlist_data[j]
-                                        playlist_value = playlist_data[j + 1]
-                                        
-                                        if playlist_key.tag == 'key':
-                                            f.write(f'        <key>{playlist_key.text}</key>\n')
-                                            
-                                            if playlist_value.tag == 'string':
-                                                f.write(f'        <string>{playlist_value.text}</string>\n')
-                                            elif playlist_value.tag == 'integer':
-                                                f.write(f'        <integer>{playlist_value.text}</integer>\n')
-                                            elif playlist_value.tag == 'array':
-                                                f.write('        <array>\n')
-                                                
-                                                for item_dict in playlist_value.findall('dict'):
-                                                    f.write('          <dict>\n')
-                                                    
-                                                    item_data = list(item_dict)
-                                                    for k in range(0, len(item_data), 2):
-                                                        if k + 1 < len(item_data):
-                                                            item_key = item_data[k]
-                                                            item_value = item_data[k + 1]
-                                                            
-                                                            if item_key.tag == 'key':
-                                                                f.write(f'            <key>{item_key.text}</key>\n')
-                                                                if item_value.tag == 'integer':
-                                                                    f.write(f'            <integer>{item_value.text}</integer>\n')
-                                                    
-                                                    f.write('          </dict>\n')
-                                                
-                                                f.write('        </array>\n')
-                                
-                                f.write('      </dict>\n')
-                            break
-                
-                f.write('    </array>\n')
-                f.write('  </dict>\n')
-                f.write('</plist>\n')
+            with open(temp_file_path, 'wb', buffering=WRITE_BUFFER_SIZE) as f:
+                if self.plist_format == 'binary':
+                    plistlib.dump(self._library_plist(), f, fmt=plistlib.FMT_BINARY, sort_keys=False)
+                else:
+                    _write_xml_plist(f, self._library_plist())
+            os.replace(temp_file_path, library_file_path)
             
             logger.info(f"iTunes Export: Library saved successfully with {total_tracks} tracks and {total_playlists} playlists")
             
         except Exception as e:
             logger.error(f"iTunes Export: Failed to save library: {e}")
+            if os.path.exists(temp_file_path):
+                os.remove(temp_file_path)
             raise
 
+    def _library_plist(self) -> Dict[str, Any]:
+        """Return the library as a plistlib-compatible dict."""
+        library = dict(self._header)
+        library['Tracks'] = {str(track_id): track for track_id, track in self._tracks.items()}
+        library['Playlists'] = self._playlists
+        return library
+
+
+def _plist_value(elem):
+    """Convert a parsed plist element into the matching Python value."""
+    tag = elem.tag
+    if tag == 'dict':
+        children = list(elem)
+        # Keys repeat across every track, so share one string object per key
+        return {
+            sys.intern(children[i].text or ''): _plist_value(children[i + 1])
+            for i in range(0, len(children) - 1, 2)
+            if children[i].tag == 'key'
+        }
+    if tag == 'array':
+        return [_plist_value(child) for child in elem]
+    if tag == 'string':
+        return elem.text or ''
+    if tag == 'integer':
+        return int(elem.text)
+    if tag == 'real':
+        return float(elem.text)
+    if tag in ('true', 'false'):
+        return tag == 'true'
+    if tag == 'date':
+        return datetime.strptime(elem.text, '%Y-%m-%dT%H:%M:%SZ')
+    if tag == 'data':
+        return base64.b64decode(elem.text or '')
+    return elem.text
+
+
+_INVALID_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+_NEEDS_ESCAPE = re.compile('[&<>\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def _escape(text: str) -> str:
+    """Escape text for XML, dropping characters XML 1.0 cannot represent."""
+    if not _NEEDS_ESCAPE.search(text):
+        return text
+    return _INVALID_XML_CHARS.sub('', escape(text))
+
+
+def _write_xml_plist(f, library: Dict[str, Any]) -> None:
+    """Write library as an XML plist that plistlib and iTunes both read.
+
+    This is much faster than plistlib's own XML writer on large libraries, and
+    every line goes straight into the buffered file.
+    """
+    out = io.TextIOWrapper(f, encoding='utf-8')
+    write = out.write
+    write('<?xml version="1.0" encoding="UTF-8"?>\n')
+    write('<!DOCTYPE plist PUBLIC "-//Apple//DTD PLIST 1.0//EN" "http://www.apple.com/DTDs/PropertyList-1.0.dtd">\n')
+    write('<plist version="1.0">\n')
+    _write_xml_value(write, library, '')
+    write('</plist>\n')
+    out.detach()
+
+
+def _write_xml_value(write, value, indent: str) -> None:
+    if isinstance(value, dict):
+        write(f'{indent}<dict>\n')
+        inner = indent + '\t'
+        for key, item in value.items():
+            write(f'{inner}<key>{_escape(key)}</key>\n')
+            # Inline the common scalar cases, they make up most of a library
+            if type(item) is str:
+                write(f'{inner}<string>{_escape(item)}</string>\n')
+            elif type(item) is int:
+                write(f'{inner}<integer>{item}</integer>\n')
+            else:
+                _write_xml_value(write, item, inner)
+        write(f'{indent}</dict>\n')
+    elif isinstance(value, (list, tuple)):
+        write(f'{indent}<array>\n')
+        inner = indent + '\t'
+        for item in value:
+            _write_xml_value(write, item, inner)
+        write(f'{indent}</array>\n')
+    elif isinstance(value, str):
+        write(f'{indent}<string>{_escape(value)}</string>\n')
+    elif isinstance(value, bool):
+        write(f'{indent}<{"true" if value else "false"}/>\n')
+    elif isinstance(value, int):
+        write(f'{indent}<integer>{value}</integer>\n')
+    elif isinstance(value, float):
+        write(f'{indent}<real>{value!r}</real>\n')
+    elif isinstance(value, datetime):
+        write(f'{indent}<date>{value.strftime("%Y-%m-%dT%H:%M:%SZ")}</date>\n')
+    elif isinstance(value, bytes):
+        write(f'{indent}<data>{base64.b64encode(value).decode("ascii")}</data>\n')
+    else:
+        raise TypeError(f"Unsupported plist value: {type(value).__name__}")
+
 
-def get_exporter_by_name(name: str) -> BaseExporter:
+def get_exporter_by_name(name: str, itunes_format: str = "xml") -> BaseExporter:
     name = name.lower()
     logger.debug(f"Creating exporter for format: {name}")
     
     if name == "json":
         return JSONExporter()
+    elif name == "jsonl":
+        return JSONExporter(lines=True)
     elif name == "m3u8":
         return M3U8Exporter()
     elif name in ("itunes", "xml"):
-        return ITunesExporter()
+        return ITunesExporter(itunes_format)
     else:
         logger.error(f"Unknown exporter type: {name}")
         raise ValueError(f"Unknown exporter type: {name}")
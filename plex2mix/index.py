@@ -0,0 +1,400 @@
+import os
+import array
+import sqlite3
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, FrozenSet, Iterable, NamedTuple, Optional, Set, Tuple
+
+from plex2mix.dedupe import HASH_NAME, DedupeStore, file_digest
+from plex2mix.transfer import corrupt_path
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+class IndexEntry(NamedTuple):
+    """Local state of a downloaded media part."""
+    path: str
+    size: int
+    mtime: float
+    updated_at: Optional[int]
+    digest: Optional[str] = None
+
+
+class PlaylistState(NamedTuple):
+    """Server state of a playlist when it was last synced."""
+    updated_at: Optional[int]
+    leaf_count: int
+    items_hash: str
+
+
+class PlaylistSnapshot(NamedTuple):
+    """Ordered media parts of a playlist and the formats its exports were last written in."""
+    items: Tuple[int, ...]
+    formats: FrozenSet[str]
+
+
+class TrackIndex:
+    """Persistent SQLite map of Plex media part ids to the files downloaded for them.
+
+    The whole table is loaded in one query when the index is opened, so deciding
+    what a sync has to fetch never touches the filesystem for tracks that are
+    already known. The index also remembers the state of every synced playlist.
+    Changes are kept in memory and written back by flush().
+    """
+
+    def __init__(self, db_path: str) -> None:
+        self.db_path = os.path.expanduser(str(db_path))
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS tracks ("
+            "part_id INTEGER PRIMARY KEY, "
+            "path TEXT NOT NULL, "
+            "size INTEGER NOT NULL, "
+            "mtime REAL NOT NULL, "
+            "updated_at INTEGER, "
+            "digest TEXT)"
+        )
+        # Indexes created before checksums were stored lack the digest column
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(tracks)")}
+        if "digest" not in columns:
+            self._conn.execute("ALTER TABLE tracks ADD COLUMN digest TEXT")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS playlists ("
+            "rating_key INTEGER PRIMARY KEY, "
+            "updated_at INTEGER, "
+            "leaf_count INTEGER NOT NULL, "
+            "items_hash TEXT NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS manifest ("
+            "rating_key INTEGER NOT NULL, "
+            "part_id INTEGER NOT NULL, "
+            "PRIMARY KEY (rating_key, part_id))"
+        )
+        # Ordered media part ids of each playlist, as last written to its exports
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS snapshots ("
+            "rating_key INTEGER PRIMARY KEY, "
+            "items BLOB NOT NULL, "
+            "formats TEXT NOT NULL)"
+        )
+        self._conn.commit()
+        self._load()
+        logger.info(f"Loaded track index with {len(self._entries)} entries from {self.db_path}")
+
+    def _load(self) -> None:
+        self._entries: Dict[int, IndexEntry] = {
+            row[0]: IndexEntry(*row[1:])
+            for row in self._conn.execute("SELECT part_id, path, size, mtime, updated_at, digest FROM tracks")
+        }
+        self._playlists: Dict[int, PlaylistState] = {
+            row[0]: PlaylistState(*row[1:])
+            for row in self._conn.execute("SELECT rating_key, updated_at, leaf_count, items_hash FROM playlists")
+        }
+        manifests: Dict[int, Set[int]] = {}
+        for rating_key, part_id in self._conn.execute("SELECT rating_key, part_id FROM manifest"):
+            manifests.setdefault(rating_key, set()).add(part_id)
+        self._manifests: Dict[int, FrozenSet[int]] = {key: frozenset(ids) for key, ids in manifests.items()}
+        self._snapshots: Dict[int, PlaylistSnapshot] = {
+            rating_key: PlaylistSnapshot(_unpack_items(items), frozenset(formats.split(",")) - {""})
+            for rating_key, items, formats in self._conn.execute("SELECT rating_key, items, formats FROM snapshots")
+        }
+        self._dirty: Dict[int, Optional[IndexEntry]] = {}
+        self._dirty_snapshots: Dict[int, Optional[PlaylistSnapshot]] = {}
+        self._dirty_playlists: Dict[int, Optional[PlaylistState]] = {}
+        self._dirty_manifests: Dict[int, Optional[FrozenSet[int]]] = {}
+
+    def reload(self) -> None:
+        """Write pending changes, then read the database again.
+
+        Picks up changes other processes made, e.g. entries dropped by verify
+        or prune, so a long-running process does not act on stale state.
+        """
+        self.flush()
+        with self._lock:
+            self._load()
+        logger.info(f"Reloaded track index with {len(self._entries)} entries")
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, part_id: int) -> Optional[IndexEntry]:
+        """Return the indexed state of a media part, if any."""
+        return self._entries.get(part_id)
+
+    def put(self, part_id: int, entry: IndexEntry) -> None:
+        """Record the local state of a media part."""
+        with self._lock:
+            self._entries[part_id] = entry
+            self._dirty[part_id] = entry
+
+    def record(self, part_id: int, path: str, updated_at: Optional[int] = None,
+               digest: Optional[str] = None) -> IndexEntry:
+        """Stat a freshly written file and record it.
+
+        Without a digest, the one already stored is kept as long as the file
+        itself did not change.
+        """
+        stat = os.stat(path)
+        previous = self._entries.get(part_id)
+        if (digest is None and previous is not None and previous.path == path
+                and previous.size == stat.st_size and previous.mtime == stat.st_mtime):
+            digest = previous.digest
+        entry = IndexEntry(path, stat.st_size, stat.st_mtime, updated_at, digest)
+        self.put(part_id, entry)
+        return entry
+
+    def remove(self, part_id: int) -> None:
+        """Forget a media part."""
+        with self._lock:
+            if self._entries.pop(part_id, None) is not None:
+                self._dirty[part_id] = None
+
+    def get_playlist(self, rating_key: int) -> Optional[PlaylistState]:
+        """Return the state of a playlist when it was last synced, if any."""
+        return self._playlists.get(rating_key)
+
+    def put_playlist(self, rating_key: int, state: PlaylistState) -> None:
+        """Record the state of a playlist that was just synced."""
+        with self._lock:
+            self._playlists[rating_key] = state
+            self._dirty_playlists[rating_key] = state
+
+    def get_manifest(self, rating_key: int) -> Optional[FrozenSet[int]]:
+        """Return the media parts a playlist referenced when it was last synced, if known."""
+        return self._manifests.get(rating_key)
+
+    def put_manifest(self, rating_key: int, part_ids: Iterable[int]) -> None:
+        """Record the media parts a playlist references."""
+        part_ids = frozenset(part_ids)
+        with self._lock:
+            self._manifests[rating_key] = part_ids
+            self._dirty_manifests[rating_key] = part_ids
+
+    def get_snapshot(self, rating_key: int) -> Optional[PlaylistSnapshot]:
+        """Return the items of a playlist as its exports were last written, if known."""
+        return self._snapshots.get(rating_key)
+
+    def put_snapshot(self, rating_key: int, part_ids: Iterable[int], formats: Iterable[str]) -> None:
+        """Record the ordered media parts a playlist's exports were just written with."""
+        snapshot = PlaylistSnapshot(tuple(part_ids), frozenset(formats))
+        with self._lock:
+            self._snapshots[rating_key] = snapshot
+            self._dirty_snapshots[rating_key] = snapshot
+
+    def prune(self, rating_keys: Iterable[int], root: str, dry_run: bool = False) -> Tuple[int, int]:
+        """Delete the files that none of the given playlists references any more.
+
+        The referenced parts are the union of the playlists' manifests, so the
+        files to remove are found from the index alone, without walking the
+        download tree. Manifests and snapshots of other playlists are dropped
+        and album and artist folders left empty are removed. Returns (files, bytes).
+        """
+        rating_keys = set(rating_keys)
+        missing = [key for key in rating_keys if key not in self._manifests]
+        if missing:
+            raise ValueError(f"{len(missing)} saved playlists have no manifest yet, sync them first")
+
+        referenced: Set[int] = set()
+        for key in rating_keys:
+            referenced |= self._manifests[key]
+        orphans = [(part_id, entry) for part_id, entry in self._entries.items() if part_id not in referenced]
+        # Paths still used by a referenced part, e.g. after a part id changed on the server
+        kept_paths = {self._entries[part_id].path for part_id in referenced if part_id in self._entries}
+
+        files = size = 0
+        folders = set()
+        for part_id, entry in orphans:
+            if entry.path not in kept_paths:
+                files += 1
+                size += entry.size
+                logger.info(f"Index: {'would remove' if dry_run else 'removing'} '{entry.path}'")
+                if not dry_run:
+                    try:
+                        os.remove(entry.path)
+                    except FileNotFoundError:
+                        pass
+                    folders.add(os.path.dirname(entry.path))
+            if not dry_run:
+                self.remove(part_id)
+
+        if not dry_run:
+            with self._lock:
+                for key in [key for key in self._manifests if key not in rating_keys]:
+                    del self._manifests[key]
+                    self._dirty_manifests[key] = None
+                for key in [key for key in self._snapshots if key not in rating_keys]:
+                    del self._snapshots[key]
+                    self._dirty_snapshots[key] = None
+            _remove_empty_folders(folders, root)
+            self.flush()
+        return files, size
+
+    def clear_playlists(self) -> None:
+        """Forget the synced state of every playlist, so the next sync lists them all again."""
+        with self._lock:
+            for rating_key in self._playlists:
+                self._dirty_playlists[rating_key] = None
+            self._playlists.clear()
+
+    def verify(self, checksums: bool = False, workers: Optional[int] = None,
+               store: Optional[DedupeStore] = None) -> Tuple[int, int, int, int]:
+        """Rebuild the index from disk.
+
+        Every indexed file is stat'ed once; entries whose file disappeared are
+        dropped and entries whose size or mtime changed are refreshed with a
+        cleared updatedAt, so the next sync re-checks them against the server.
+        With checksums set, every file is also hashed and compared with its
+        stored digest, see verify_checksums().
+        Returns (checked, updated, removed, corrupt).
+        """
+        checked = updated = removed = 0
+        for part_id, entry in list(self._entries.items()):
+            checked += 1
+            try:
+                stat = os.stat(entry.path)
+            except FileNotFoundError:
+                logger.info(f"Index: '{entry.path}' is missing, dropping it")
+                self.remove(part_id)
+                removed += 1
+                continue
+
+            if stat.st_size != entry.size or stat.st_mtime != entry.mtime:
+                logger.info(f"Index: '{entry.path}' changed on disk, refreshing it")
+                self.put(part_id, IndexEntry(entry.path, stat.st_size, stat.st_mtime, None))
+                updated += 1
+
+        corrupt = self.verify_checksums(workers, store) if checksums else 0
+        self.flush()
+        logger.info(f"Index: verified {checked} entries, updated {updated}, removed {removed}, corrupt {corrupt}")
+        return checked, updated, removed, corrupt
+
+    def verify_checksums(self, workers: Optional[int] = None, store: Optional[DedupeStore] = None) -> int:
+        """Hash every indexed file across a process pool and compare it with its stored digest.
+
+        Files without a digest, or with one from another hash function, get
+        theirs recorded. Files whose content no longer matches are moved aside
+        to '<file>.corrupt' and dropped from the index, and all playlist states
+        are cleared, so the next sync downloads them again. The corrupt copy is
+        only deleted once that download succeeds. The stored copy a corrupt file
+        is linked to in the dedupe store, corrupt as well, is removed from it.
+        Returns the number of corrupt files.
+        """
+        entries = list(self._entries.items())
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            digests = pool.map(_digest, [entry.path for _, entry in entries], chunksize=16)
+            corrupt = 0
+            for (part_id, entry), digest in zip(entries, digests):
+                if digest is None:
+                    continue
+                if entry.digest is None or not entry.digest.startswith(HASH_NAME + ":"):
+                    self.put(part_id, entry._replace(digest=digest))
+                elif entry.digest != digest:
+                    logger.warning(f"Index: '{entry.path}' does not match its checksum, queueing it for download")
+                    if store is not None:
+                        try:
+                            store.evict(entry.path)
+                        except OSError as e:
+                            logger.error(f"Index: could not evict '{entry.path}' from the dedupe store: {e}")
+                    try:
+                        os.replace(entry.path, corrupt_path(entry.path))
+                    except OSError as e:
+                        logger.error(f"Index: could not move '{entry.path}' aside: {e}")
+                    self.remove(part_id)
+                    corrupt += 1
+
+        if corrupt:
+            self.clear_playlists()
+        return corrupt
+
+    def flush(self) -> None:
+        """Write pending changes to the database in a single transaction."""
+        with self._lock:
+            if not (self._dirty or self._dirty_playlists or self._dirty_manifests or self._dirty_snapshots):
+                return
+            dirty, self._dirty = self._dirty, {}
+            playlists, self._dirty_playlists = self._dirty_playlists, {}
+            manifests, self._dirty_manifests = self._dirty_manifests, {}
+            snapshots, self._dirty_snapshots = self._dirty_snapshots, {}
+
+            upserts = [(part_id, *entry) for part_id, entry in dirty.items() if entry is not None]
+            deletes = [(part_id,) for part_id, entry in dirty.items() if entry is None]
+            with self._conn:
+                if upserts:
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO tracks (part_id, path, size, mtime, updated_at, digest) VALUES (?, ?, ?, ?, ?, ?)",
+                        upserts
+                    )
+                if deletes:
+                    self._conn.executemany("DELETE FROM tracks WHERE part_id = ?", deletes)
+                playlist_upserts = [(rating_key, *state) for rating_key, state in playlists.items() if state is not None]
+                playlist_deletes = [(rating_key,) for rating_key, state in playlists.items() if state is None]
+                if playlist_upserts:
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO playlists (rating_key, updated_at, leaf_count, items_hash) VALUES (?, ?, ?, ?)",
+                        playlist_upserts
+                    )
+                if playlist_deletes:
+                    self._conn.executemany("DELETE FROM playlists WHERE rating_key = ?", playlist_deletes)
+                if manifests:
+                    self._conn.executemany("DELETE FROM manifest WHERE rating_key = ?",
+                                           [(rating_key,) for rating_key in manifests])
+                    self._conn.executemany(
+                        "INSERT INTO manifest (rating_key, part_id) VALUES (?, ?)",
+                        [(rating_key, part_id) for rating_key, part_ids in manifests.items()
+                         for part_id in part_ids or ()]
+                    )
+                snapshot_upserts = [(rating_key, _pack_items(snapshot.items), ",".join(sorted(snapshot.formats)))
+                                    for rating_key, snapshot in snapshots.items() if snapshot is not None]
+                snapshot_deletes = [(rating_key,) for rating_key, snapshot in snapshots.items() if snapshot is None]
+                if snapshot_upserts:
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO snapshots (rating_key, items, formats) VALUES (?, ?, ?)",
+                        snapshot_upserts
+                    )
+                if snapshot_deletes:
+                    self._conn.executemany("DELETE FROM snapshots WHERE rating_key = ?", snapshot_deletes)
+        logger.debug(f"Index: flushed {len(upserts)} updates, {len(deletes)} deletions, {len(playlists)} playlists, "
+                     f"{len(manifests)} manifests and {len(snapshots)} snapshots")
+
+    def close(self) -> None:
+        """Flush pending changes and close the database."""
+        self.flush()
+        self._conn.close()
+
+
+def _remove_empty_folders(folders: Iterable[str], root: str) -> None:
+    """Remove each folder and its parents up to root, as long as they are empty."""
+    root = os.path.abspath(root)
+    for folder in sorted(folders, key=len, reverse=True):
+        folder = os.path.abspath(folder)
+        while folder != root and folder.startswith(root + os.sep):
+            try:
+                os.rmdir(folder)
+            except OSError:
+                break
+            logger.debug(f"Index: removed empty folder '{folder}'")
+            folder = os.path.dirname(folder)
+
+
+def _pack_items(part_ids: Tuple[int, ...]) -> bytes:
+    """Store a snapshot as packed 64-bit integers, a fraction of the size of a table row per item."""
+    return array.array("q", part_ids).tobytes()
+
+
+def _unpack_items(data: bytes) -> Tuple[int, ...]:
+    items = array.array("q")
+    items.frombytes(data)
+    return tuple(items)
+
+
+def _digest(path: str) -> Optional[str]:
+    """Digest a file in a worker process, None if it cannot be read."""
+    try:
+        return file_digest(path)
+    except OSError as e:
+        logger.warning(f"Index: could not read '{path}': {e}")
+        return None
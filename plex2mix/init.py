@@ -30,7 +30,12 @@ __email__ = "z4jyol8l@duck.com"
 __description__ = "Plex music downloader for DJs"
 __license__ = "GPL-3.0-or-later"
 
-# Make main CLI function available at package level
-from .main import cli
-
 __all__ = ["cli", "__version__"]
+
+
+def __getattr__(name):
+    # Make main CLI function available at package level without importing it eagerly
+    if name == "cli":
+        from .main import cli
+        return cli
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,24 +1,35 @@
 #!/usr/bin/env python3
 import sys
 import time
+import queue
 import yaml
 import click
 import logging
 from pathlib import Path
-from concurrent.futures import as_completed
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, TYPE_CHECKING
 
-from plexapi.myplex import MyPlexPinLogin, MyPlexAccount
-from plexapi.server import PlexServer
 from plex2mix import __version__
-from plex2mix.downloader import Downloader
-from plex2mix.exporter import get_exporter_by_name
+from plex2mix.catalog import Catalog
+from plex2mix.config import ConfigStore
+from plex2mix.stats import RunStats
+
+# plexapi, the downloader and the exporters are imported on first use so that
+# --help, config and reset start without loading them
+if TYPE_CHECKING:
+    from plexapi.server import PlexServer
+    from plex2mix.downloader import Downloader
+    from plex2mix.index import TrackIndex
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
 CONFIG_DIR = Path(click.get_app_dir("plex2mix"))
 CONFIG_FILE = CONFIG_DIR / "config.yaml"
+INDEX_FILE = CONFIG_DIR / "index.db"
+CATALOG_FILE = CONFIG_DIR / "catalog.json"
+SOCKET_FILE = CONFIG_DIR / "daemon.sock"
+# Number of upcoming playlists whose items are fetched while earlier ones download
+PREFETCH_PLAYLISTS = 2
 
 
 def setup_logging(verbose: bool = False):
@@ -58,33 +69,10 @@ def show_banner():
     click.echo()  # Empty line for spacing
 
 
-def load_config() -> Dict[str, Any]:
-    logger.debug(f"Loading configuration from {CONFIG_FILE}")
-    
-    if not CONFIG_DIR.exists():
-        logger.info(f"Creating config directory: {CONFIG_DIR}")
-        CONFIG_DIR.mkdir(parents=True, exist_ok=True)
-
-    if not CONFIG_FILE.exists():
-        logger.info(f"Creating new config file: {CONFIG_FILE}")
-        CONFIG_FILE.write_text(yaml.dump({}))
-
-    with CONFIG_FILE.open("r") as f:
-        config = yaml.safe_load(f) or {}
-
-    logger.debug(f"Loaded configuration with {len(config)} keys")
-    return config
-
-
-def save_config(config: Dict[str, Any]) -> None:
-    logger.debug(f"Saving configuration to {CONFIG_FILE}")
-    with CONFIG_FILE.open("w") as f:
-        yaml.dump(config, f)
-    logger.debug("Configuration saved successfully")
-
-
-def login(token: str = "") -> PlexServer:
+def login(token: str = "") -> "PlexServer":
     """Authenticate with Plex and return a connected PlexServer."""
+    from plexapi.myplex import MyPlexPinLogin, MyPlexAccount
+
     logger.info("Starting Plex authentication")
     
     if not token:
@@ -121,7 +109,7 @@ def login(token: str = "") -> PlexServer:
             index = 0
             logger.debug(f"Using single available server: {resources[0].name}")
 
-        server: PlexServer = resources[index].connect()
+        server = resources[index].connect()
         logger.info(f"Connected to Plex server: {server.friendlyName}")
         click.echo(f"Connected to {server.friendlyName}")
         return server
@@ -173,6 +161,7 @@ def interactive_mode(ctx):
                     ctx.invoke(list)
                     
                 elif cmd == 'download' or cmd == 'dl':
+                    ctx.obj["stats"].reset()
                     # Parse download arguments
                     indices = []
                     download_all = False
@@ -190,7 +179,7 @@ def interactive_mode(ctx):
                     
                     # If no indices and not --all, prompt for selection
                     if not indices and not download_all:
-                        playlists = ctx.obj["downloaders"][0].get_playlists()
+                        playlists = ctx.obj["catalog"].playlists()
                         if playlists:
                             # Show playlists first
                             ctx.invoke(list)
@@ -206,7 +195,7 @@ def interactive_mode(ctx):
                     
                     # Execute download
                     if download_all:
-                        playlists = ctx.obj["downloaders"][0].get_playlists()
+                        playlists = ctx.obj["catalog"].playlists()
                         indices = list(range(len(playlists)))
                     
                     if indices:
@@ -221,7 +210,7 @@ def interactive_mode(ctx):
                     indices = [int(arg) for arg in args if arg.isdigit()]
                     
                     if not indices:
-                        playlists = ctx.obj["downloaders"][0].get_playlists()
+                        playlists = ctx.obj["catalog"].playlists()
                         if playlists:
                             ctx.invoke(list)
                             click.echo()
@@ -246,6 +235,21 @@ def interactive_mode(ctx):
                 elif cmd == 'status':
                     show_status(ctx)
                     
+                elif cmd == 'verify':
+                    checksums = '-c' in args or '--checksums' in args
+                    ctx.invoke(verify, checksums=checksums)
+                    
+                elif cmd == 'refresh-catalog':
+                    ctx.invoke(refresh_catalog)
+                    
+                elif cmd == 'prune':
+                    dry_run = '-n' in args or '--dry-run' in args
+                    ctx.invoke(prune, dry_run=dry_run)
+                    
+                elif cmd == 'dedupe':
+                    dry_run = '-n' in args or '--dry-run' in args
+                    ctx.invoke(dedupe, dry_run=dry_run)
+                    
                 else:
                     click.echo(f"Unknown command: {cmd}")
                     click.echo("Type 'help' for available commands.")
@@ -276,6 +280,10 @@ def show_interactive_help():
   refresh [-f]                - Refresh saved playlists (-f: force overwrite)
   ignore [indices]            - Ignore playlists
   status                      - Show current status
+  verify [-c]                 - Rebuild the local track index from disk (-c: check checksums)
+  refresh-catalog             - Fetch the playlist listing again
+  prune [-n]                  - Remove tracks no saved playlist references (-n: dry run)
+  dedupe [-n]                 - Hardlink identical downloaded files (-n: dry run)
 
 ⚙️  Configuration:
   config                      - Show current configuration
@@ -299,7 +307,7 @@ def show_status(ctx):
     """Show current plex2mix status."""
     config = ctx.obj["config"]
     try:
-        playlists = ctx.obj["downloaders"][0].get_playlists()
+        playlists = ctx.obj["catalog"].playlists()
         saved = config["playlists"]["saved"]
         ignored = config["playlists"]["ignored"]
         
@@ -311,20 +319,36 @@ def show_status(ctx):
         click.echo(f"🎼 Playlist path: {config['playlists_path']}")
         click.echo(f"📤 Export formats: {', '.join(config['export_formats'])}")
         click.echo(f"🧵 Download threads: {config['threads']}")
-        click.echo(f"🖥️  Server: {config['server']['name']}")
+        click.echo(f"🖥️  Server: {config.get('server', {}).get('name', 'not connected')}")
         
     except Exception as e:
         click.echo(f"Error getting status: {e}")
 
 
-def download_playlists(ctx, indices: List[int], overwrite: bool = False):
-    """Download playlists by indices."""
-    logger.info(f"Starting download for {len(indices)} playlists (overwrite={overwrite})")
+def download_playlists(ctx, indices: List[int], overwrite: bool = False, incremental: bool = False,
+                       raise_errors: bool = False):
+    """Download playlists by indices.
+
+    Playlists are pipelined: the item lists of upcoming playlists are fetched
+    while earlier ones download, every track goes to the same download engine,
+    and each playlist is completed as soon as its own tracks are done.
+
+    With incremental set, playlists that did not change on the server since
+    their last sync are skipped without fetching their items. Callers reset
+    the run statistics before listing the catalog, so the report includes it.
+    Errors are reported and swallowed, unless raise_errors is set, in which
+    case the run raises once it is over if any playlist failed to sync.
+    """
+    logger.info(f"Starting download for {len(indices)} playlists (overwrite={overwrite}, incremental={incremental})")
     
     try:
-        playlists = ctx.obj["downloaders"][0].get_playlists()
+        stats = ctx.obj["stats"]
+        downloader = get_downloader(ctx)
+        downloader.start_run()
+        playlists = ctx.obj["catalog"].playlists()
         saved, ignored = ctx.obj["config"]["playlists"]["saved"], ctx.obj["config"]["playlists"]["ignored"]
 
+        selected = []
         for i in indices:
             if i >= len(playlists):
                 logger.error(f"Invalid playlist index: {i} (max: {len(playlists)-1})")
@@ -338,104 +362,221 @@ def download_playlists(ctx, indices: List[int], overwrite: bool = False):
                 click.echo(f"Skipping ignored playlist: {playlist.title}")
                 continue
 
-            logger.info(f"Processing playlist: {playlist.title}")
-            click.echo(f"Processing playlist: {playlist.title}")
-            
-            for downloader in ctx.obj["downloaders"]:
-                try:
-                    logger.debug(f"Starting download with {type(downloader.exporter).__name__}")
-                    tasks = downloader.download(playlist, overwrite=overwrite)
-                    
-                    if tasks:
-                        logger.info(f"Processing {len(tasks)} download tasks")
-                        with click.progressbar(
-                            as_completed(tasks), 
-                            length=len(tasks), 
-                            label=f"{playlist.title} ({downloader.exporter.name})"
-                        ) as bar:
-                            for _ in bar:
-                                pass
-                    else:
-                        logger.warning(f"No tracks to download for {playlist.title}")
-                        click.echo(f"No tracks to download for {playlist.title}")
-                        
-                except Exception as e:
-                    logger.error(f"Error downloading {playlist.title} with {downloader.exporter.name}: {e}")
-                    click.echo(f"Error downloading {playlist.title} with {downloader.exporter.name}: {e}", err=True)
+            if any(other.ratingKey == playlist.ratingKey for other in selected):
+                continue
+
+            if incremental and not overwrite and downloader.is_unchanged(playlist):
+                logger.info(f"Skipping unchanged playlist: {playlist.title}")
+                click.echo(f"Unchanged: {playlist.title}")
+                continue
+
+            selected.append(playlist)
+
+        if not selected:
+            return
+
+        # Pinned playlists are listed, and their downloads queued, first
+        selected.sort(key=lambda playlist: playlist.ratingKey not in downloader.pinned)
+
+        def complete(playlist, tasks, error: bool = False):
+            """Finish a playlist once all of its downloads are done."""
+            failed = sum(1 for task in tasks if task.exception() is not None)
+            if failed:
+                logger.error(f"{failed} tracks failed to download for {playlist.title}")
+                click.echo(f"\n{failed} tracks failed to download for {playlist.title}", err=True)
+            elif not error:
+                synced.append(playlist)
+            if failed or error:
+                errors.append(playlist.title)
 
             # Update playlist status
             if playlist.ratingKey not in saved:
-                saved.append(playlist.ratingKey)
+                saved.add(playlist.ratingKey)
                 logger.debug(f"Added playlist {playlist.title} to saved list")
             if playlist.ratingKey in ignored:
-                ignored.remove(playlist.ratingKey)
+                ignored.discard(playlist.ratingKey)
                 logger.debug(f"Removed playlist {playlist.title} from ignored list")
 
+            # Debounced, the rest is written once the run is over
             ctx.obj["save"]()
+            downloader.index.flush()
             logger.info(f"Completed processing playlist: {playlist.title}")
-            click.echo(f"Completed: {playlist.title}")
+            click.echo(f"\nCompleted: {playlist.title}")
+
+        # Playlists are only recorded as synced once their exports are written
+        synced = []
+        errors = []
+
+        # Track completions from worker threads and handle them on this thread
+        completions = queue.Queue()
+        pending: Dict[int, int] = {}
+        submitted: Dict[int, Any] = {}
+
+        def wait_for(playlist, tasks, error: bool = False) -> None:
+            """Complete a playlist from drain() once its downloads are done."""
+            submitted[playlist.ratingKey] = (playlist, tasks, error)
+            pending[playlist.ratingKey] = len(tasks)
+            for task in tasks:
+                task.add_done_callback(lambda _, key=playlist.ratingKey: completions.put(key))
+
+        def drain(bar, block: bool) -> None:
+            while pending:
+                try:
+                    key = completions.get(block=block)
+                except queue.Empty:
+                    return
+                bar.update(1)
+                pending[key] -= 1
+                if pending[key] == 0:
+                    del pending[key]
+                    complete(*submitted.pop(key))
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        prefetched = {}
+        try:
+            with ThreadPoolExecutor(max_workers=PREFETCH_PLAYLISTS) as prefetch:
+                def schedule_prefetch(j: int) -> None:
+                    if j < len(selected):
+                        prefetched[j] = prefetch.submit(downloader.fetch_items, selected[j])
+
+                # The first playlist streams its items page by page, so its
+                # downloads start right away
+                for j in range(1, PREFETCH_PLAYLISTS + 1):
+                    schedule_prefetch(j)
+
+                total = sum(playlist.leafCount or 0 for playlist in selected)
+                with click.progressbar(length=total, label=f"{len(selected)} playlists") as bar:
+                    for j, playlist in enumerate(selected):
+                        logger.info(f"Processing playlist: {playlist.title}")
+                        schedule_prefetch(j + PREFETCH_PLAYLISTS + 1)
+                        try:
+                            tracks = prefetched.pop(j).result() if j in prefetched else None
+                            tasks = downloader.download(playlist, overwrite=overwrite, incremental=incremental, tracks=tracks)
+                        except Exception as e:
+                            logger.error(f"Error downloading {playlist.title}: {e}")
+                            click.echo(f"\nError downloading {playlist.title}: {e}", err=True)
+                            # Downloads submitted before an export failed still
+                            # run, the playlist is completed once they are done
+                            tasks = getattr(e, "tasks", [])
+                            bar.length = max(bar.pos, bar.length - max(0, (playlist.leafCount or 0) - len(tasks)))
+                            bar.update(0)
+                            if tasks:
+                                wait_for(playlist, tasks, error=True)
+                                drain(bar, block=False)
+                            else:
+                                complete(playlist, [], error=True)
+                            continue
+
+                        delta = downloader.deltas.get(playlist.ratingKey)
+                        if delta is not None:
+                            click.echo(f"\n{playlist.title}: +{delta.added} -{delta.removed} tracks, "
+                                       f"{len(tasks)} to download")
+                        # Tracks skipped as unchanged or repeated within the playlist
+                        # come off the bar, so it only measures actual downloads
+                        bar.length = max(bar.pos, bar.length - max(0, (playlist.leafCount or 0) - len(tasks)))
+                        bar.update(0)
+                        if not tasks:
+                            logger.warning(f"No tracks to download for {playlist.title}")
+                            complete(playlist, tasks)
+                            continue
+
+                        logger.info(f"Processing {len(tasks)} download tasks")
+                        wait_for(playlist, tasks)
+                        drain(bar, block=False)
+
+                    drain(bar, block=True)
+        finally:
+            # Exporters that buffer across playlists write their output once
+            downloader.flush_exports()
+            ctx.obj["store"].flush()
+
+        for playlist in synced:
+            downloader.commit_playlist(playlist)
+        downloader.index.flush()
+
+        if downloader.coalesced:
+            logger.info(f"Saved {downloader.coalesced} duplicate downloads across playlists")
+            click.echo(f"Saved {downloader.coalesced} duplicate downloads across playlists")
+
+        requests = sum(downloader.item_requests.values())
+        logger.info(f"Listed the items of {len(downloader.item_requests)} playlists in {requests} requests")
+
+        report = stats.report()
+        report["item_requests"] = requests
+        report["order"] = downloader.order
+        for line in stats.summary(report):
+            click.echo(line)
+        if ctx.obj["options"].get("stats_json"):
+            stats.write_json(ctx.obj["options"]["stats_json"], report)
+
+        if errors and raise_errors:
+            raise RuntimeError(f"Failed to sync {len(errors)} playlists: {', '.join(errors)}")
 
     except Exception as e:
         logger.error(f"Error during download process: {e}")
         click.echo(f"Error during download: {e}", err=True)
+        if raise_errors:
+            raise
 
 
-@click.group(invoke_without_command=True)
-@click.option("-v", "--verbose", is_flag=True, help="Enable verbose logging")
-@click.version_option(version=__version__, prog_name="plex2mix")
-@click.pass_context
-def cli(ctx, verbose: bool) -> None:
-    """plex2mix CLI"""
-    show_banner()
-    setup_logging(verbose)
-    ctx.ensure_object(dict)
-    
-    logger.info("Starting plex2mix CLI")
-    config = load_config()
-
-    # Handle authentication
-    if not config.get("token"):
-        logger.info("No authentication token found, starting login process")
-        server = login()
-        config["token"] = server._token
-        config["server"] = {"url": server._baseurl, "name": server.friendlyName}
-        save_config(config)
-        logger.info("Authentication completed and saved")
-    else:
-        logger.debug("Using existing authentication token")
-        try:
-            server = PlexServer(config["server"]["url"], config["token"])
-            logger.info(f"Successfully connected to server: {config['server']['name']}")
-        except Exception as e:
-            logger.warning(f"Failed to connect with existing token: {e}")
-            click.echo(f"Could not connect to server: {e}", err=True)
-            click.echo(f"Clearing invalid token. Please run the command again to re-authenticate.")
-            config.pop("token", None)
-            config.pop("server", None)
-            save_config(config)
-            logger.info("Invalid token cleared, user needs to re-authenticate")
-            sys.exit(1)
+def refresh_playlists(ctx, force: bool = False, rating_keys: Optional[List[int]] = None,
+                      raise_errors: bool = False) -> None:
+    """Sync the given playlists, or every saved playlist, skipping unchanged ones unless forced.
 
+    With raise_errors set, failures are raised, see download_playlists().
+    """
+    # The report covers connecting and listing the catalog as well
+    ctx.obj["stats"].reset()
+    # Change detection relies on updatedAt, so never trust a cached listing here
+    playlists = ctx.obj["catalog"].refresh()
+    saved = ctx.obj["config"]["playlists"]["saved"]
+    wanted = saved if rating_keys is None else set(rating_keys)
+
+    if not wanted:
+        logger.warning("No saved playlists to refresh")
+        click.echo("No saved playlists to refresh")
+        return
+
+    # Find indices of saved playlists
+    indices = []
+    for i, p in enumerate(playlists):
+        if p.ratingKey in wanted:
+            indices.append(i)
+
+    if not indices:
+        logger.warning("No saved playlists found on server")
+        click.echo("No saved playlists found on server")
+        return
+
+    logger.info(f"Refreshing {len(indices)} saved playlists")
+    click.echo(f"Refreshing {len(indices)} saved playlists...")
+    download_playlists(ctx, indices, overwrite=force, incremental=not force, raise_errors=raise_errors)
+
+
+def setup_config(store: ConfigStore) -> None:
+    """Prompt for any missing settings and create the download directories."""
+    config = store.config
     # Setup paths
     if "path" not in config:
         logger.info("Download path not configured, prompting user")
         path = Path(click.prompt("Enter path to download to", default="~/Music")).expanduser() / "plex2mix"
         config["path"] = str(path)
-        save_config(config)
+        store.save(force=True)
         logger.info(f"Download path set to: {path}")
 
     if "threads" not in config:
         logger.info("Thread count not configured, prompting user")
         config["threads"] = click.prompt("Enter number of download threads", default=4, type=int)
-        save_config(config)
+        store.save(force=True)
         logger.info(f"Thread count set to: {config['threads']}")
 
     # Initialize playlist tracking
     playlists_config = config.get("playlists")
     if not playlists_config or not hasattr(playlists_config, 'get'):
         logger.info("Initializing playlist tracking configuration")
-        config["playlists"] = {"saved": [], "ignored": []}
-        save_config(config)
+        config["playlists"] = {"saved": set(), "ignored": set()}
+        store.save(force=True)
 
     # Setup export formats
     export_formats = config.get("export_formats")
@@ -443,7 +584,7 @@ def cli(ctx, verbose: bool) -> None:
         logger.info("Export formats not configured, prompting user")
         formats = click.prompt("Select export formats (comma-separated, e.g., m3u8,itunes)", default="m3u8")
         config["export_formats"] = [f.strip() for f in formats.split(",") if f.strip()]
-        save_config(config)
+        store.save(force=True)
         logger.info(f"Export formats set to: {config['export_formats']}")
 
     # Create directories
@@ -454,42 +595,185 @@ def cli(ctx, verbose: bool) -> None:
     if not config.get("playlists_path"):
         playlists_path = path / "playlists"
         config["playlists_path"] = str(playlists_path)
-        save_config(config)
+        store.save(force=True)
         logger.info(f"Playlists path set to: {playlists_path}")
 
     Path(config["playlists_path"]).mkdir(parents=True, exist_ok=True)
     logger.debug(f"Ensured playlists directory exists: {config['playlists_path']}")
 
-    # Create downloaders for each export format
-    downloaders = []
-    logger.info(f"Creating downloaders for {len(config['export_formats'])} export formats")
+
+def get_server(ctx) -> "PlexServer":
+    """Return the Plex server connection, authenticating and connecting on first use."""
+    if ctx.obj.get("server") is not None:
+        return ctx.obj["server"]
+
+    config = ctx.obj["config"]
+
+    # Handle authentication
+    if not config.get("token"):
+        logger.info("No authentication token found, starting login process")
+        server = login()
+        config["token"] = server._token
+        config["server"] = {"url": server._baseurl, "name": server.friendlyName}
+        ctx.obj["store"].save(force=True)
+        logger.info("Authentication completed and saved")
+    else:
+        logger.debug("Using existing authentication token")
+        from plexapi.server import PlexServer
+        try:
+            server = PlexServer(config["server"]["url"], config["token"])
+            logger.info(f"Successfully connected to server: {config['server']['name']}")
+        except Exception as e:
+            logger.warning(f"Failed to connect with existing token: {e}")
+            click.echo(f"Could not connect to server: {e}", err=True)
+            click.echo(f"Clearing invalid token. Please run the command again to re-authenticate.")
+            config.pop("token", None)
+            config.pop("server", None)
+            ctx.obj["store"].save(force=True)
+            logger.info("Invalid token cleared, user needs to re-authenticate")
+            sys.exit(1)
+
+    ctx.obj["server"] = server
+    return server
+
+
+def get_index(ctx) -> "TrackIndex":
+    """Return the local track index, opening it on first use."""
+    if ctx.obj.get("index") is None:
+        from plex2mix.index import TrackIndex
+        ctx.obj["index"] = TrackIndex(INDEX_FILE)
+    return ctx.obj["index"]
+
+
+def get_downloader(ctx) -> "Downloader":
+    """Return the downloader, creating it and its exporters on first use."""
+    if ctx.obj.get("downloader") is not None:
+        return ctx.obj["downloader"]
+
+    from plex2mix.dedupe import DedupeStore
+    from plex2mix.downloader import Downloader, ORDER_POLICIES
+    from plex2mix.engine import ThreadEngine, AsyncEngine
+    from plex2mix.exporter import get_exporter_by_name
+    from plex2mix.throttle import Throttle, parse_rate, parse_schedule
+
+    config, options = ctx.obj["config"], ctx.obj["options"]
+
+    # Create one exporter per format, all fed by a single downloader
+    exporters = []
+    logger.info(f"Creating exporters for {len(config['export_formats'])} export formats")
     
     for fmt in config["export_formats"]:
         try:
-            exporter = get_exporter_by_name(fmt)
-            downloader = Downloader(
-                server,
-                config["path"],
-                config["playlists_path"],
-                config["threads"],
-                exporter=exporter
-            )
-            downloaders.append(downloader)
-            logger.debug(f"Created downloader for format: {fmt}")
+            exporters.append(get_exporter_by_name(fmt, config.get("itunes_format", "xml")))
+            logger.debug(f"Created exporter for format: {fmt}")
         except ValueError as e:
             logger.error(f"Failed to create exporter for format '{fmt}': {e}")
             click.echo(f"Warning: {e}", err=True)
 
-    if not downloaders:
-        logger.error("No valid downloaders created")
+    if not exporters:
+        logger.error("No valid exporters created")
         click.echo("No valid export formats configured", err=True)
         sys.exit(1)
 
-    logger.info(f"Successfully created {len(downloaders)} downloaders")
+    # Bandwidth and connection limits shared by every download
+    max_rate = options["max_rate"]
+    try:
+        throttle = Throttle(
+            parse_rate(max_rate if max_rate is not None else config.get("max_rate")),
+            options["max_connections"] or config.get("max_connections"),
+            parse_schedule(config.get("rate_schedule"))
+        )
+    except ValueError as e:
+        logger.error(f"Invalid throttle settings: {e}")
+        click.echo(f"Invalid throttle settings: {e}", err=True)
+        sys.exit(1)
+
+    # Select the download engine
+    engine = None
+    if config.get("engine", "threads") == "async":
+        try:
+            concurrency = config.get("concurrency", 32)
+            if throttle.max_connections:
+                concurrency = min(concurrency, throttle.max_connections)
+            engine = AsyncEngine(concurrency)
+        except ImportError as e:
+            logger.error(f"Failed to start async engine: {e}")
+            click.echo(f"Warning: {e}, falling back to threads", err=True)
+    if engine is None:
+        engine = ThreadEngine(config["threads"])
+
+    # Order in which queued downloads start
+    order = options["order"] or config.get("download_order", "playlist")
+    if order not in ORDER_POLICIES:
+        logger.error(f"Unknown download order: {order}")
+        click.echo(f"Warning: unknown download order '{order}', using playlist order", err=True)
+        order = "playlist"
+
+    downloader = Downloader(
+        get_server(ctx),
+        config["path"],
+        config["playlists_path"],
+        config["threads"],
+        exporters=exporters,
+        index=get_index(ctx),
+        engine=engine,
+        throttle=throttle,
+        store=DedupeStore(config["path"]) if config.get("dedupe") else None,
+        stats=ctx.obj["stats"],
+        order=order,
+        pinned=config.get("pinned_playlists") or ()
+    )
+    logger.info(f"Successfully created downloader with {len(exporters)} exporters")
+    ctx.obj["downloader"] = downloader
+    return downloader
+
+
+def shutdown_engine(ctx) -> None:
+    """Wait for the downloads still queued, if a downloader was created, and stop its engine."""
+    downloader = ctx.obj.get("downloader")
+    if downloader is not None:
+        logger.debug("Shutting down the download engine")
+        downloader.engine.shutdown()
+
+
+@click.group(invoke_without_command=True)
+@click.option("-v", "--verbose", is_flag=True, help="Enable verbose logging")
+@click.option("--max-rate", help="Cap total download bandwidth, e.g. 20M (bytes per second)")
+@click.option("--max-connections", type=int, help="Cap concurrent connections to the Plex server")
+@click.option("--no-cache", is_flag=True, help="Ignore the cached playlist listing")
+@click.option("--stats-json", type=click.Path(dir_okay=False), help="Append a JSON report of each sync to this file")
+@click.option("--order", type=click.Choice(["playlist", "smallest", "shortest"]),
+              help="Order in which queued downloads start (default: download_order from the config, playlist)")
+@click.version_option(version=__version__, prog_name="plex2mix")
+@click.pass_context
+def cli(ctx, verbose: bool, max_rate: str, max_connections: int, no_cache: bool, stats_json: str,
+        order: str) -> None:
+    """plex2mix CLI"""
+    show_banner()
+    setup_logging(verbose)
+    ctx.ensure_object(dict)
+    
+    logger.info("Starting plex2mix CLI")
+    store = ConfigStore(CONFIG_FILE)
+    config = store.load()
+    ctx.call_on_close(store.flush)
+    # Runs before the flush above, letting queued and running downloads finish
+    ctx.call_on_close(lambda: shutdown_engine(ctx))
+
+    # Commands that only deal with the configuration file need no setup
+    if ctx.invoked_subcommand not in ("config", "reset"):
+        setup_config(store)
+
+    # The server connection and the downloader are only created on first use
     ctx.obj["config"] = config
-    ctx.obj["server"] = server
-    ctx.obj["save"] = lambda: save_config(config)
-    ctx.obj["downloaders"] = downloaders
+    ctx.obj["server"] = None
+    ctx.obj["options"] = {"max_rate": max_rate, "max_connections": max_connections, "stats_json": stats_json,
+                          "order": order}
+    ctx.obj["store"] = store
+    ctx.obj["save"] = store.save
+    ctx.obj["stats"] = RunStats()
+    ctx.obj["catalog"] = Catalog(lambda: get_server(ctx), CATALOG_FILE, config.get("catalog_ttl", 300),
+                                 use_cache=not no_cache, stats=ctx.obj["stats"])
     
     # If no command was invoked, start interactive mode
     if ctx.invoked_subcommand is None:
@@ -504,7 +788,7 @@ def list(ctx) -> None:
     logger.info("Listing playlists")
     
     try:
-        playlists = ctx.obj["downloaders"][0].get_playlists()
+        playlists = ctx.obj["catalog"].playlists()
         saved, ignored = ctx.obj["config"]["playlists"]["saved"], ctx.obj["config"]["playlists"]["ignored"]
 
         if not playlists:
@@ -539,7 +823,8 @@ def download(ctx, indices: List[int], download_all: bool, overwrite: bool) -> No
     """Download playlists"""
     logger.info(f"Download command called (all={download_all}, overwrite={overwrite}, indices={indices})")
     
-    playlists = ctx.obj["downloaders"][0].get_playlists()
+    ctx.obj["stats"].reset()
+    playlists = ctx.obj["catalog"].playlists()
     
     if download_all:
         logger.info("Downloading all playlists")
@@ -573,28 +858,7 @@ def refresh(ctx, force: bool) -> None:
     logger.info(f"Refresh command called (force={force})")
     
     try:
-        playlists = ctx.obj["downloaders"][0].get_playlists()
-        saved = ctx.obj["config"]["playlists"]["saved"]
-
-        if not saved:
-            logger.warning("No saved playlists to refresh")
-            click.echo("No saved playlists to refresh")
-            return
-
-        # Find indices of saved playlists
-        indices = []
-        for i, p in enumerate(playlists):
-            if p.ratingKey in saved:
-                indices.append(i)
-
-        if not indices:
-            logger.warning("No saved playlists found on server")
-            click.echo("No saved playlists found on server")
-            return
-
-        logger.info(f"Refreshing {len(indices)} saved playlists")
-        click.echo(f"Refreshing {len(indices)} saved playlists...")
-        download_playlists(ctx, indices, overwrite=force)
+        refresh_playlists(ctx, force=force)
         
     except Exception as e:
         logger.error(f"Error during refresh: {e}")
@@ -609,7 +873,7 @@ def ignore(ctx, indices: List[int]) -> None:
     logger.info(f"Ignore command called with indices: {indices}")
     
     try:
-        playlists = ctx.obj["downloaders"][0].get_playlists()
+        playlists = ctx.obj["catalog"].playlists()
         saved, ignored = ctx.obj["config"]["playlists"]["saved"], ctx.obj["config"]["playlists"]["ignored"]
 
         if not indices:
@@ -638,16 +902,16 @@ def ignore(ctx, indices: List[int]) -> None:
             playlist = playlists[i]
             
             if playlist.ratingKey in saved:
-                saved.remove(playlist.ratingKey)
+                saved.discard(playlist.ratingKey)
                 logger.debug(f"Removed playlist {playlist.title} from saved list")
             if playlist.ratingKey not in ignored:
-                ignored.append(playlist.ratingKey)
+                ignored.add(playlist.ratingKey)
                 logger.debug(f"Added playlist {playlist.title} to ignored list")
                 
             logger.info(f"Ignored playlist: {playlist.title}")
             click.echo(f"Ignored playlist \"{playlist.title}\"")
 
-        ctx.obj["save"]()
+        ctx.obj["save"](force=True)
         logger.info(f"Configuration saved after ignoring {len(indices)} playlists")
         
     except Exception as e:
@@ -655,13 +919,216 @@ def ignore(ctx, indices: List[int]) -> None:
         click.echo(f"Error ignoring playlists: {e}", err=True)
 
 
+@cli.command("refresh-catalog")
+@click.pass_context
+def refresh_catalog(ctx) -> None:
+    """Fetch the playlist listing again"""
+    logger.info("Refresh catalog command called")
+    
+    try:
+        playlists = ctx.obj["catalog"].refresh()
+        click.echo(f"Found {len(playlists)} playlists")
+        
+    except Exception as e:
+        logger.error(f"Error refreshing playlist listing: {e}")
+        click.echo(f"Error refreshing playlist listing: {e}", err=True)
+
+
+@cli.command()
+@click.option("--checksums", "-c", is_flag=True, help="Also hash every file and compare it with its stored checksum")
+@click.option("--workers", "-w", type=int, default=None, help="Number of parallel hashing processes")
+@click.pass_context
+def verify(ctx, checksums: bool, workers: int) -> None:
+    """Rebuild the local track index from disk"""
+    logger.info(f"Verify command called (checksums={checksums})")
+    
+    try:
+        config = ctx.obj["config"]
+        index = get_index(ctx)
+        store = None
+        if config.get("dedupe"):
+            from plex2mix.dedupe import DedupeStore
+            store = DedupeStore(config["path"])
+        click.echo(f"Verifying {len(index)} indexed tracks...")
+        checked, updated, removed, corrupt = index.verify(checksums=checksums, workers=workers, store=store)
+        click.echo(f"Checked {checked} tracks: {updated} changed, {removed} missing, {corrupt} corrupt")
+        if corrupt:
+            click.echo(f"Moved {corrupt} corrupt files aside (*.corrupt), run 'plex2mix refresh' to download them again")
+        
+    except Exception as e:
+        logger.error(f"Error verifying index: {e}")
+        click.echo(f"Error verifying index: {e}", err=True)
+
+
+@cli.command()
+@click.option("--dry-run", "-n", is_flag=True, help="Only report what would be removed")
+@click.pass_context
+def prune(ctx, dry_run: bool) -> None:
+    """Remove downloaded tracks no saved playlist references"""
+    logger.info(f"Prune command called (dry_run={dry_run})")
+    
+    try:
+        config = ctx.obj["config"]
+        saved = config["playlists"]["saved"]
+        files, size = get_index(ctx).prune(saved, config["path"], dry_run=dry_run)
+        verb = "Would remove" if dry_run else "Removed"
+        click.echo(f"{verb} {files} tracks no longer in any of the {len(saved)} saved playlists, "
+                   f"freeing {size / 1024 ** 2:.1f} MiB")
+        if files and not dry_run and config.get("dedupe"):
+            from plex2mix.dedupe import DedupeStore
+            DedupeStore(config["path"]).prune()
+        
+    except ValueError as e:
+        logger.error(f"Cannot prune: {e}")
+        click.echo(f"Cannot prune: {e} (plex2mix refresh)", err=True)
+    except Exception as e:
+        logger.error(f"Error pruning tracks: {e}")
+        click.echo(f"Error pruning tracks: {e}", err=True)
+
+
+@cli.command()
+@click.option("--dry-run", "-n", is_flag=True, help="Only report what would be linked")
+@click.option("--workers", "-w", type=int, default=None, help="Number of parallel hashing workers")
+@click.pass_context
+def dedupe(ctx, dry_run: bool, workers: int) -> None:
+    """Hardlink identical downloaded files to reclaim space"""
+    logger.info(f"Dedupe command called (dry_run={dry_run})")
+    from plex2mix import dedupe as dedupe_store
+    
+    try:
+        config = ctx.obj["config"]
+        path = Path(config["path"]).expanduser()
+        click.echo(f"Looking for duplicate files in {path}...")
+        # Exported playlists and the iTunes library may be kept under path
+        groups, linked, reclaimed = dedupe_store.dedupe(str(path), dry_run=dry_run, workers=workers,
+                                                        exclude=[config["playlists_path"]])
+        verb = "Would link" if dry_run else "Linked"
+        click.echo(f"{verb} {linked} files in {groups} groups, reclaiming {reclaimed / 1024 ** 2:.1f} MiB")
+        if not dry_run:
+            pruned = dedupe_store.DedupeStore(str(path)).prune()
+            if pruned:
+                logger.info(f"Removed {pruned} unreferenced files from the dedupe store")
+        
+    except Exception as e:
+        logger.error(f"Error deduplicating files: {e}")
+        click.echo(f"Error deduplicating files: {e}", err=True)
+
+
+@cli.command()
+@click.option("--interval", "-i", type=int, default=None,
+              help="Seconds between scheduled syncs (default: daemon_interval from the config, 900)")
+@click.option("--socket", "socket_path", type=click.Path(dir_okay=False), default=None,
+              help="Unix socket accepting status and sync requests")
+@click.option("--watch/--no-watch", default=None,
+              help="Sync saved playlists as soon as the server reports them changed (default: watch from the config)")
+@click.pass_context
+def daemon(ctx, interval: int, socket_path: str, watch: bool) -> None:
+    """Keep running and sync saved playlists on a schedule"""
+    import signal
+    from plex2mix.daemon import Daemon, DEFAULT_INTERVAL
+
+    config = ctx.obj["config"]
+    interval = interval or config.get("daemon_interval", DEFAULT_INTERVAL)
+    watch = config.get("watch", False) if watch is None else watch
+    logger.info(f"Daemon command called (interval={interval}, watch={watch})")
+
+    # Connect once, the connection, catalog and download engine are then
+    # reused by every sync for the lifetime of the process
+    downloader = get_downloader(ctx)
+
+    def sync(rating_keys: Optional[List[int]]) -> None:
+        # Other invocations may have saved or ignored playlists, or verified
+        # and pruned the index, since the previous sync
+        ctx.obj["store"].reload()
+        downloader.index.reload()
+        # Failures are raised so the daemon reports them as its last error
+        refresh_playlists(ctx, rating_keys=rating_keys, raise_errors=True)
+
+    service = Daemon(sync, socket_path or SOCKET_FILE, interval, stats=ctx.obj["stats"],
+                     pending=downloader.pending_tracks, promote=downloader.promote)
+
+    def stop(signum, frame) -> None:
+        logger.info(f"Received signal {signum}, stopping after the current sync")
+        service.stop()
+
+    watcher = None
+    if watch:
+        from plex2mix.alerts import PlaylistWatcher, DEBOUNCE_DELAY
+        try:
+            watcher = PlaylistWatcher(get_server(ctx), service.request, lambda: config["playlists"]["saved"],
+                                      delay=config.get("watch_delay", DEBOUNCE_DELAY))
+            watcher.start()
+        except ImportError as e:
+            logger.error(f"Failed to watch playlists: {e}")
+            click.echo(f"Warning: {e}, only syncing on schedule", err=True)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    click.echo(f"plex2mix daemon syncing every {interval}s{' and on changes' if watcher else ''}, "
+               f"listening on {service.socket_path}")
+    try:
+        service.run()
+    except RuntimeError as e:
+        logger.error(f"Cannot start daemon: {e}")
+        click.echo(f"Cannot start daemon: {e}", err=True)
+        sys.exit(1)
+    finally:
+        if watcher is not None:
+            watcher.stop()
+
+
+@cli.command("daemon-ctl")
+@click.argument("command", type=click.Choice(["status", "sync", "stop"]))
+@click.argument("rating_keys", nargs=-1, type=int)
+@click.option("--socket", "socket_path", type=click.Path(dir_okay=False), default=None,
+              help="Unix socket of the daemon")
+@click.option("--json", "as_json", is_flag=True, help="Print the daemon's reply as JSON")
+@click.pass_context
+def daemon_ctl(ctx, command: str, rating_keys: List[int], socket_path: str, as_json: bool) -> None:
+    """Query or control a running daemon"""
+    import json
+    from plex2mix.daemon import send
+
+    try:
+        reply = send(socket_path or SOCKET_FILE, " ".join([command, *map(str, rating_keys)]))
+    except OSError as e:
+        logger.error(f"Cannot reach daemon: {e}")
+        click.echo(f"Cannot reach daemon: {e} (plex2mix daemon)", err=True)
+        sys.exit(1)
+
+    if as_json or not reply.get("ok"):
+        click.echo(json.dumps(reply, indent=2))
+        return
+    if command != "status":
+        click.echo("Sync queued" if command == "sync" else "Daemon stopping")
+        return
+
+    status = reply["status"]
+    queued = status["queued"]
+    click.echo(f"Daemon {status['pid']}: {'syncing' if status['running'] else 'idle'}, "
+               f"{status['syncs']} syncs done")
+    playlists = "all saved playlists" if queued["all"] else f"{queued['playlists']} playlists"
+    click.echo(f"Queued: {playlists}, {queued.get('tracks', 0)} tracks in flight")
+    click.echo(f"Next scheduled sync: {time.strftime('%H:%M:%S', time.localtime(status['next_run']))}")
+    current = status.get("current")
+    if current:
+        click.echo(f"Current sync: {current['bytes_per_second'] / 1024 ** 2:.2f} MiB/s, "
+                   f"{current['tracks_per_second']:.2f} tracks/s")
+    if status["last_run"]:
+        click.echo("Last sync:")
+        for line in ctx.obj["stats"].summary(status["last_run"]):
+            click.echo(f"  {line}")
+    if status["last_error"]:
+        click.echo(f"Last error: {status['last_error']}", err=True)
+
+
 @cli.command()
 @click.pass_context
 def config(ctx) -> None:
     """Show config"""
     logger.info("Displaying current configuration")
     click.echo(f"Configuration file: {CONFIG_FILE}")
-    click.echo(yaml.dump(ctx.obj["config"], default_flow_style=False))
+    click.echo(yaml.dump(ctx.obj["store"].dump(), default_flow_style=False))
 
 
 @cli.command()
@@ -671,11 +1138,15 @@ def reset(ctx) -> None:
     logger.info("Reset command called")
     
     if click.confirm("This will delete all configuration. Are you sure?"):
+        ctx.obj["store"].discard()
         if CONFIG_FILE.exists():
             CONFIG_FILE.unlink()
             logger.info(f"Deleted configuration file: {CONFIG_FILE}")
         else:
             logger.info("Configuration file does not exist")
+        if CATALOG_FILE.exists():
+            CATALOG_FILE.unlink()
+            logger.info(f"Deleted playlist cache: {CATALOG_FILE}")
         click.echo("Configuration reset. Please run the command again to reconfigure.")
     else:
         logger.info("User cancelled configuration reset")
@@ -0,0 +1,93 @@
+import os
+from typing import Optional
+
+
+class PlaylistRecord:
+    """Lightweight snapshot of a Plex playlist listing.
+
+    Mirrors the attribute names of plexapi's Playlist so it can stand in for
+    it wherever only the listing is needed, and can be cached to disk.
+    """
+
+    __slots__ = ("ratingKey", "title", "updatedAt", "leafCount")
+
+    def __init__(self, ratingKey: int, title: str, updatedAt: Optional[int], leafCount: int) -> None:
+        self.ratingKey = ratingKey
+        self.title = title
+        self.updatedAt = updatedAt
+        self.leafCount = leafCount
+
+    @property
+    def key(self) -> str:
+        return f"/playlists/{self.ratingKey}"
+
+    @classmethod
+    def from_playlist(cls, playlist) -> "PlaylistRecord":
+        updated_at = playlist.updatedAt
+        if updated_at is not None and hasattr(updated_at, "timestamp"):
+            updated_at = int(updated_at.timestamp())
+        return cls(int(playlist.ratingKey), playlist.title, updated_at, int(playlist.leafCount or 0))
+
+    def to_list(self) -> list:
+        return [self.ratingKey, self.title, self.updatedAt, self.leafCount]
+
+    def __repr__(self) -> str:
+        return f"<PlaylistRecord {self.ratingKey}: {self.title}>"
+
+
+class TrackRecord:
+    """Everything needed to download and export one track.
+
+    Built once per track straight from the server's XML, so no plexapi
+    Track (whose media and parts may trigger reloads) is ever kept around.
+    """
+
+    __slots__ = ("ratingKey", "title", "artist", "album", "duration", "updatedAt",
+                 "partId", "partKey", "size", "path")
+
+    def __init__(self, ratingKey: int, title: str, artist: str, album: str, duration: Optional[int],
+                 updatedAt: Optional[int], partId: int, partKey: str, size: int, path: str) -> None:
+        self.ratingKey = ratingKey
+        self.title = title
+        self.artist = artist
+        self.album = album
+        self.duration = duration
+        self.updatedAt = updatedAt
+        self.partId = partId
+        self.partKey = partKey
+        self.size = size
+        self.path = path
+
+    @property
+    def seconds(self) -> int:
+        """Duration in whole seconds, -1 when unknown."""
+        return int(self.duration / 1000) if self.duration else -1
+
+    @classmethod
+    def from_element(cls, elem, root: str) -> Optional["TrackRecord"]:
+        """Extract a <Track> element of a raw Plex response, None if it has no media part."""
+        part = elem.find("Media/Part")
+        if part is None:
+            return None
+        attrs = elem.attrib
+        artist = attrs.get("grandparentTitle") or "Unknown Artist"
+        album = attrs.get("parentTitle") or "Unknown Album"
+        duration = attrs.get("duration")
+        updated_at = attrs.get("updatedAt")
+        path = os.path.join(root, artist, album, os.path.basename(part.get("file", "")))
+        return cls(int(attrs["ratingKey"]), attrs.get("title"), artist, album,
+                   int(duration) if duration else None, int(updated_at) if updated_at else None,
+                   int(part.get("id")), part.get("key"), int(part.get("size", 0)), path)
+
+    def to_dict(self) -> dict:
+        """Return the track metadata written by the exporters."""
+        return {
+            "title": self.title,
+            "artist": self.artist,
+            "album": self.album,
+            "path": self.path,
+            "duration": self.seconds,
+        }
+
+    def __repr__(self) -> str:
+        return f"<TrackRecord {self.ratingKey}: {self.title}>"
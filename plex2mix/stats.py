@@ -0,0 +1,130 @@
+import json
+import math
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    """Return the p-th percentile (0-100) of values by nearest rank."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(p / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+class RunStats:
+    """Timings and counters of one sync run, shared by every worker thread.
+
+    Phases (catalog, items, plan, transfer, export.<format>) collect one duration
+    sample per call, so the report can give their totals and percentiles.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """Start a new run."""
+        with self._lock:
+            self.started = time.time()
+            self._clock = time.perf_counter()
+            self.phases: Dict[str, List[float]] = {}
+            self.latencies: List[float] = []
+            self.first_track: Optional[float] = None
+            self.bytes = 0
+            self.fetched = 0
+            self.skipped = 0
+            self.failed = 0
+
+    def add(self, phase: str, seconds: float) -> None:
+        """Record one duration sample of a phase."""
+        with self._lock:
+            self.phases.setdefault(phase, []).append(seconds)
+
+    @contextmanager
+    def timer(self, phase: str):
+        """Time the enclosed block as one sample of phase."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(phase, time.perf_counter() - start)
+
+    def track(self, seconds: float, transferred: Optional[int] = None, failed: bool = False) -> None:
+        """Record a finished track: fetched with the bytes transferred, skipped, or failed."""
+        with self._lock:
+            self.latencies.append(seconds)
+            if failed:
+                self.failed += 1
+            elif transferred is None:
+                self.skipped += 1
+            else:
+                self.fetched += 1
+                self.bytes += transferred
+                if self.first_track is None:
+                    self.first_track = time.perf_counter() - self._clock
+
+    def report(self) -> Dict[str, Any]:
+        """Return the run's figures as a JSON-serializable dict."""
+        with self._lock:
+            elapsed = time.perf_counter() - self._clock
+            tracks = self.fetched + self.skipped + self.failed
+            return {
+                "started_at": int(self.started),
+                "elapsed": round(elapsed, 3),
+                "bytes": self.bytes,
+                "bytes_per_second": round(self.bytes / elapsed, 1) if elapsed else 0.0,
+                "tracks": {"fetched": self.fetched, "skipped": self.skipped, "failed": self.failed},
+                "tracks_per_second": round(tracks / elapsed, 2) if elapsed else 0.0,
+                "time_to_first_track": _round(self.first_track),
+                "track_latency": {
+                    "p50": _round(percentile(self.latencies, 50)),
+                    "p95": _round(percentile(self.latencies, 95)),
+                },
+                "phases": {
+                    phase: {
+                        "count": len(samples),
+                        "total": round(sum(samples), 3),
+                        "p50": _round(percentile(samples, 50)),
+                        "p95": _round(percentile(samples, 95)),
+                    }
+                    for phase, samples in sorted(self.phases.items())
+                },
+            }
+
+    def summary(self, report: Optional[Dict[str, Any]] = None) -> List[str]:
+        """Return the human readable lines of a report."""
+        report = report or self.report()
+        tracks = report["tracks"]
+        latency = report["track_latency"]
+        lines = [
+            f"{tracks['fetched']} fetched, {tracks['skipped']} skipped, {tracks['failed']} failed "
+            f"in {report['elapsed']:.1f}s",
+            f"{report['bytes'] / 1024 ** 2:.1f} MiB at {report['bytes_per_second'] / 1024 ** 2:.2f} MiB/s, "
+            f"{report['tracks_per_second']:.2f} tracks/s",
+        ]
+        if report.get("time_to_first_track") is not None:
+            lines.append(f"First track downloaded after {report['time_to_first_track']:.2f}s")
+        if latency["p50"] is not None:
+            lines.append(f"Track latency p50 {latency['p50']:.3f}s, p95 {latency['p95']:.3f}s")
+        for phase, figures in report["phases"].items():
+            lines.append(f"  {phase}: {figures['count']} calls, {figures['total']:.2f}s total, "
+                         f"p50 {figures['p50']:.3f}s, p95 {figures['p95']:.3f}s")
+        return lines
+
+    def write_json(self, path: str, report: Optional[Dict[str, Any]] = None) -> None:
+        """Append a report to path as one JSON line, so runs can be compared over time."""
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(report or self.report()) + "\n")
+        logger.info(f"Wrote run statistics to {path}")
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 4) if value is not None else None
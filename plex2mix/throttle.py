@@ -0,0 +1,109 @@
+import re
+import time
+import asyncio
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+_WINDOW = re.compile(r"^(\d{1,2}):(\d{2})-(\d{1,2}):(\d{2})=(.+)$")
+
+
+def parse_rate(value) -> Optional[int]:
+    """Parse a rate such as '20M' or '512K' into bytes per second.
+
+    Returns None for an unlimited rate ('0', 'unlimited' or empty).
+    """
+    if value is None:
+        return None
+    text = str(value).strip().upper()
+    if text in ("", "0", "UNLIMITED", "NONE"):
+        return None
+    match = re.match(r"^(\d+(?:\.\d+)?)\s*([KMG]?)(?:I?B)?(?:/S)?$", text)
+    if not match:
+        raise ValueError(f"Invalid rate: {value}")
+    rate = int(float(match.group(1)) * _UNITS[match.group(2)])
+    return rate or None
+
+
+def parse_schedule(entries) -> List[Tuple[int, int, Optional[int]]]:
+    """Parse 'HH:MM-HH:MM=RATE' entries into (start, end, rate) minute windows."""
+    windows = []
+    for entry in entries or []:
+        match = _WINDOW.match(str(entry).replace(" ", ""))
+        if not match:
+            raise ValueError(f"Invalid schedule entry: {entry}")
+        start_h, start_m, end_h, end_m, rate = match.groups()
+        windows.append((int(start_h) * 60 + int(start_m), int(end_h) * 60 + int(end_m), parse_rate(rate)))
+    return windows
+
+
+class Throttle:
+    """Process-wide token-bucket bandwidth limiter and connection cap.
+
+    Every download worker draws from the same bucket, so the configured rate
+    holds across all playlists no matter how many downloads run in parallel.
+    Schedule windows override the base rate during given times of day.
+    """
+
+    def __init__(self, rate: Optional[int] = None, max_connections: Optional[int] = None,
+                 schedule: Optional[List[Tuple[int, int, Optional[int]]]] = None) -> None:
+        self.rate = rate
+        self.max_connections = max_connections
+        self.schedule = schedule or []
+        self._lock = threading.Lock()
+        self._tokens = 0.0
+        self._stamp = time.monotonic()
+        self._connections = threading.BoundedSemaphore(max_connections) if max_connections else None
+        logger.info(f"Initialized throttle (rate={rate}, max_connections={max_connections}, "
+                    f"{len(self.schedule)} schedule windows)")
+
+    def current_rate(self, now: Optional[datetime] = None) -> Optional[int]:
+        """Return the rate in effect at the given time of day."""
+        if self.schedule:
+            now = now or datetime.now()
+            minute = now.hour * 60 + now.minute
+            for start, end, rate in self.schedule:
+                inside = start <= minute < end if start <= end else (minute >= start or minute < end)
+                if inside:
+                    return rate
+        return self.rate
+
+    def _reserve(self, amount: int) -> float:
+        """Take amount bytes from the bucket and return how long to wait for them."""
+        rate = self.current_rate()
+        if not rate:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            # Allow at most one second worth of burst
+            self._tokens = min(float(rate), self._tokens + (now - self._stamp) * rate)
+            self._stamp = now
+            self._tokens -= amount
+            return max(0.0, -self._tokens / rate)
+
+    def consume(self, amount: int) -> None:
+        """Block until amount bytes may be transferred."""
+        delay = self._reserve(amount)
+        if delay:
+            time.sleep(delay)
+
+    async def consume_async(self, amount: int) -> None:
+        """Wait without blocking the event loop until amount bytes may be transferred."""
+        delay = self._reserve(amount)
+        if delay:
+            await asyncio.sleep(delay)
+
+    @contextmanager
+    def connection(self):
+        """Hold one of the capped connection slots."""
+        if self._connections is None:
+            yield
+            return
+        with self._connections:
+            yield
@@ -0,0 +1,129 @@
+import os
+import logging
+from contextlib import nullcontext
+from typing import Optional, Tuple, Union
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+PART_SUFFIX = ".part"
+# Files failing their checksum are moved aside under this suffix until downloaded again
+CORRUPT_SUFFIX = ".corrupt"
+
+
+def part_path(filepath: str) -> str:
+    """Return the temporary path a download is streamed into."""
+    return filepath + PART_SUFFIX
+
+
+def corrupt_path(filepath: str) -> str:
+    """Return the path a corrupt copy of a file is kept at until it is downloaded again."""
+    return filepath + CORRUPT_SUFFIX
+
+
+def _resume_offset(temp_path: str, size: Optional[int], restart: bool) -> int:
+    """Return the byte offset an existing '.part' file lets a download resume from."""
+    if restart and os.path.exists(temp_path):
+        os.remove(temp_path)
+
+    offset = os.path.getsize(temp_path) if os.path.exists(temp_path) else 0
+    if size is not None and offset > size:
+        logger.warning(f"Discarding '{temp_path}' (larger than the server copy)")
+        offset = 0
+    return offset
+
+
+def _finish(filepath: str, temp_path: str, size: Optional[int], transferred: int) -> int:
+    """Rename a complete '.part' file into place."""
+    written = os.path.getsize(temp_path)
+    if size is not None and written != size:
+        raise IOError(f"Incomplete download of '{filepath}': {written}/{size} bytes")
+
+    os.replace(temp_path, filepath)
+    try:
+        os.remove(corrupt_path(filepath))
+        logger.info(f"Removed the corrupt copy of '{filepath}'")
+    except FileNotFoundError:
+        pass
+    logger.debug(f"Completed '{filepath}' ({written} bytes, {transferred} transferred)")
+    return transferred
+
+
+def fetch(session, url: str, filepath: str, size: Optional[int] = None, restart: bool = False,
+          chunk_size: int = CHUNK_SIZE, timeout: Union[float, Tuple[float, float], None] = None,
+          throttle=None) -> int:
+    """Stream url into filepath, resuming an interrupted download.
+
+    Bytes are appended to a '.part' file next to the destination, continuing
+    from its current length with an HTTP Range request. The file is only
+    renamed into place once it reaches the expected size, so a killed process
+    never leaves a truncated file under the final name. An optional Throttle
+    caps the transfer rate and the number of open connections. Returns the
+    number of bytes transferred.
+    """
+    size = size or None
+    temp_path = part_path(filepath)
+    offset = _resume_offset(temp_path, size, restart)
+
+    transferred = 0
+    while size is None or offset < size:
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        with throttle.connection() if throttle else nullcontext():
+            with session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+                if offset and response.status_code == 416:
+                    # The partial file no longer matches what the server has
+                    logger.warning(f"Server rejected resume of '{filepath}' at byte {offset}, restarting")
+                    offset = _resume_offset(temp_path, size, restart=True)
+                    continue
+
+                response.raise_for_status()
+                if offset and response.status_code != 206:
+                    logger.warning(f"Server ignored range request for '{filepath}', restarting from byte 0")
+                    offset = 0
+
+                if offset:
+                    logger.info(f"Resuming '{filepath}' at byte {offset}")
+                with open(temp_path, "ab" if offset else "wb") as f:
+                    for chunk in response.iter_content(chunk_size):
+                        f.write(chunk)
+                        transferred += len(chunk)
+                        if throttle:
+                            throttle.consume(len(chunk))
+        break
+
+    return _finish(filepath, temp_path, size, transferred)
+
+
+async def fetch_async(session, url: str, filepath: str, size: Optional[int] = None, restart: bool = False,
+                      chunk_size: int = CHUNK_SIZE, throttle=None) -> int:
+    """Coroutine counterpart of fetch() for an aiohttp session."""
+    size = size or None
+    temp_path = part_path(filepath)
+    offset = _resume_offset(temp_path, size, restart)
+
+    transferred = 0
+    while size is None or offset < size:
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        async with session.get(url, headers=headers) as response:
+            if offset and response.status == 416:
+                logger.warning(f"Server rejected resume of '{filepath}' at byte {offset}, restarting")
+                offset = _resume_offset(temp_path, size, restart=True)
+                continue
+
+            response.raise_for_status()
+            if offset and response.status != 206:
+                logger.warning(f"Server ignored range request for '{filepath}', restarting from byte 0")
+                offset = 0
+
+            if offset:
+                logger.info(f"Resuming '{filepath}' at byte {offset}")
+            with open(temp_path, "ab" if offset else "wb") as f:
+                async for chunk in response.content.iter_chunked(chunk_size):
+                    f.write(chunk)
+                    transferred += len(chunk)
+                    if throttle:
+                        await throttle.consume_async(len(chunk))
+        break
+
+    return _finish(filepath, temp_path, size, transferred)
@@ -23,6 +23,11 @@ setup(
         "plexapi>=4.9",
         "pyyaml>=6.0",
     ],
+    extras_require={
+        "async": ["aiohttp>=3.8"],
+        "dedupe": ["xxhash>=3.0"],
+        "watch": ["websocket-client>=1.0"],
+    },
     entry_points={
         'console_scripts': [
             'plex2mix=plex2mix.main:cli',
@@ -0,0 +1,183 @@
+import json
+import time
+import base64
+import socket
+import hashlib
+import threading
+
+import pytest
+
+from plex2mix.alerts import DELETED_STATE, PLAYLIST_TYPE, PlaylistWatcher, changed_playlists
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+def timeline(*entries) -> dict:
+    return {"type": "timeline", "size": len(entries), "TimelineEntry": list(entries)}
+
+
+def entry(key, type=PLAYLIST_TYPE, state=5) -> dict:
+    return {"itemID": str(key), "type": type, "state": state}
+
+
+def test_changed_playlists_keeps_playlist_changes_in_order():
+    data = timeline(entry(2), entry(1), entry(2), entry(7, type=10), entry(3, state=DELETED_STATE))
+    assert changed_playlists(data) == [2, 1]
+
+
+def test_changed_playlists_ignores_other_notifications():
+    assert changed_playlists({"type": "playing", "PlaySessionStateNotification": [{"key": "1"}]}) == []
+    assert changed_playlists({"type": "timeline"}) == []
+    assert changed_playlists(timeline({"type": PLAYLIST_TYPE}, entry("abc"))) == []
+
+
+class FakeNotificationServer:
+    """Minimal websocket endpoint sending Plex notifications, with a plexapi-compatible url()."""
+
+    def __init__(self) -> None:
+        self._socket = socket.socket()
+        self._socket.bind(("127.0.0.1", 0))
+        self._socket.listen()
+        self.port = self._socket.getsockname()[1]
+        self._messages = []
+        self._connected = threading.Event()
+        self._closing = threading.Event()
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def url(self, key: str, includeToken: bool = False) -> str:
+        return f"http://127.0.0.1:{self.port}{key}"
+
+    def send(self, data: dict) -> None:
+        assert self._connected.wait(5), "the watcher never connected"
+        payload = json.dumps({"NotificationContainer": data}).encode("utf-8")
+        header = bytes([0x81, len(payload)]) if len(payload) < 126 else \
+            bytes([0x81, 126]) + len(payload).to_bytes(2, "big")
+        self._conn.sendall(header + payload)
+
+    def close(self) -> None:
+        self._closing.set()
+        self._socket.close()
+
+    def _serve(self) -> None:
+        conn, _ = self._socket.accept()
+        request = conn.recv(4096).decode("ascii")
+        key = next(line.split(":", 1)[1].strip() for line in request.split("\r\n")
+                   if line.lower().startswith("sec-websocket-key"))
+        accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode("ascii")).digest()).decode("ascii")
+        conn.sendall(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                      f"Sec-WebSocket-Accept: {accept}\r\n\r\n").encode("ascii"))
+        self._conn = conn
+        self._connected.set()
+        # Answer the client's close frame, so stopping the watcher does not wait for a timeout
+        conn.settimeout(0.1)
+        while not self._closing.is_set():
+            try:
+                frame = conn.recv(4096)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            if not frame or frame[0] & 0x0F == 0x8:
+                conn.sendall(bytes([0x88, 0]))
+                break
+        conn.close()
+
+
+class Requests:
+    """Collects the watcher's sync requests."""
+
+    def __init__(self) -> None:
+        self.calls = []
+        self.event = threading.Event()
+
+    def __call__(self, keys) -> None:
+        self.calls.append(keys)
+        self.event.set()
+
+
+@pytest.fixture
+def watch():
+    pytest.importorskip("websocket")
+    pytest.importorskip("plexapi.alert")
+    server = FakeNotificationServer()
+    watchers = []
+
+    def start(request, watched, delay=0.2):
+        watcher = PlaylistWatcher(server, request, watched, delay=delay)
+        watcher.start()
+        watchers.append(watcher)
+        return watcher
+
+    yield server, start
+    close(server, watchers)
+
+
+def close(server, watchers) -> None:
+    # Dropping the connection first lets the listener return on its own;
+    # closing the websocket from another thread can leave it blocked
+    server.close()
+    time.sleep(0.3)
+    for watcher in watchers:
+        watcher.stop()
+
+
+def test_burst_of_edits_triggers_one_sync(watch):
+    server, start = watch
+    requests = Requests()
+    saved = {1, 2}
+    start(requests, lambda: saved)
+
+    for _ in range(5):
+        server.send(timeline(entry(1)))
+        time.sleep(0.02)
+    server.send(timeline(entry(2), entry(1)))
+
+    assert requests.event.wait(5)
+    time.sleep(0.5)
+    assert requests.calls == [[1, 2]]
+
+
+def test_unsaved_playlists_and_deletions_are_filtered(watch):
+    server, start = watch
+    requests = Requests()
+    # Ignored playlists are never in the saved set
+    saved = {1, 2}
+    start(requests, lambda: saved)
+
+    server.send(timeline(entry(99)))
+    server.send(timeline(entry(2, state=DELETED_STATE)))
+    server.send(timeline(entry(1, type=10)))
+    time.sleep(0.5)
+    assert requests.calls == []
+
+    server.send(timeline(entry(99), entry(1)))
+    assert requests.event.wait(5)
+    time.sleep(0.5)
+    assert requests.calls == [[1]]
+
+
+def test_newly_saved_playlists_are_watched(watch):
+    server, start = watch
+    requests = Requests()
+    saved = set()
+    start(requests, lambda: saved)
+
+    server.send(timeline(entry(5)))
+    time.sleep(0.4)
+    saved.add(5)
+    server.send(timeline(entry(5)))
+
+    assert requests.event.wait(5)
+    assert requests.calls == [[5]]
+
+
+def test_stop_drops_pending_changes(watch):
+    server, start = watch
+    requests = Requests()
+    watcher = start(requests, lambda: {1}, delay=1.0)
+
+    server.send(timeline(entry(1)))
+    time.sleep(0.1)
+    close(server, [watcher])
+    time.sleep(1.0)
+    assert requests.calls == []
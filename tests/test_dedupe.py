@@ -0,0 +1,51 @@
+import os
+
+from plex2mix.dedupe import DedupeStore, dedupe, file_digest, find_duplicates, iter_files
+from plex2mix.index import TrackIndex
+
+
+def write(path, data: bytes) -> str:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_duplicates_are_linked(tmp_path):
+    album = write(tmp_path / "Artist" / "Album" / "01.flac", b"recording" * 1000)
+    compilation = write(tmp_path / "Various" / "Hits" / "07.flac", b"recording" * 1000)
+    write(tmp_path / "Artist" / "Album" / "02.flac", b"other take" * 900)
+
+    assert dedupe(str(tmp_path)) == (1, 1, 9000)
+    assert os.path.samefile(album, compilation)
+
+
+def test_exports_and_temporary_files_are_skipped(tmp_path):
+    track = write(tmp_path / "Artist" / "Album" / "01.flac", b"recording" * 1000)
+    playlists = tmp_path / "playlists"
+    write(playlists / "Warmup.m3u8", b"#EXTM3U\n")
+    write(playlists / "Peak.m3u8", b"#EXTM3U\n")
+    write(tmp_path / "Artist" / "Album" / "01.flac.tmp", b"recording" * 1000)
+    write(tmp_path / "Artist" / "Album" / "02.flac.link", b"recording" * 1000)
+
+    assert list(iter_files(str(tmp_path), exclude=[str(playlists)])) == [track]
+    assert find_duplicates(str(tmp_path), exclude=[str(playlists)]) == []
+
+
+def test_corrupt_file_is_evicted_from_the_store(tmp_path):
+    store = DedupeStore(str(tmp_path))
+    track = write(tmp_path / "Artist" / "Album" / "01.flac", b"recording" * 1000)
+    store.add(track)
+    index = TrackIndex(str(tmp_path / "index.db"))
+    index.record(1, track, digest=file_digest(track))
+
+    # Corrupted in place, the stored hardlink is corrupted along with it
+    with open(track, "r+b") as f:
+        f.write(b"garbage")
+    assert index.verify_checksums(workers=1, store=store) == 1
+    index.close()
+    assert list(iter_files(store.root)) == []
+
+    # The download that replaces it is stored again, not taken for a collision
+    redownloaded = write(tmp_path / "Artist" / "Album" / "01.flac", b"recording" * 1000)
+    assert not store.add(redownloaded)
+    assert os.stat(redownloaded).st_nlink == 2
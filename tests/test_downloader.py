@@ -0,0 +1,99 @@
+import os
+import threading
+
+import pytest
+
+from plex2mix.downloader import Downloader, ExportError
+from plex2mix.engine import ThreadEngine
+from plex2mix.exporter import get_exporter_by_name
+from plex2mix.index import TrackIndex
+from plex2mix.records import PlaylistRecord, TrackRecord
+
+
+def make_tracks(count: int) -> list:
+    return [TrackRecord(i, f"Track {i}", "Artist", "Album", 200000, None, i, f"/parts/{i}", 1000,
+                        f"/music/Artist/Album/{i}.flac") for i in range(count)]
+
+
+@pytest.fixture
+def downloader(tmp_path):
+    engine = ThreadEngine(2)
+    downloader = Downloader(None, str(tmp_path / "music"), str(tmp_path), engine=engine,
+                            exporters=[get_exporter_by_name("m3u8"), get_exporter_by_name("json")])
+    downloader.release = threading.Event()
+    downloader.downloaded = []
+
+    def download_track(track, overwrite=False):
+        downloader.release.wait(5)
+        downloader.downloaded.append(track.ratingKey)
+        return track.path
+
+    downloader._download_track = download_track
+    yield downloader
+    downloader.release.set()
+    engine.shutdown()
+
+
+def test_download_exports_and_returns_tasks(downloader, tmp_path):
+    downloader.release.set()
+    tasks = downloader.download(PlaylistRecord(1, "Warmup", None, 3), tracks=make_tracks(3))
+
+    assert [task.result(5) for task in tasks] == [track.path for track in make_tracks(3)]
+    assert (tmp_path / "Warmup.m3u8").read_text().count(".flac") == 3
+    assert os.path.exists(tmp_path / "Warmup.json")
+
+
+def test_export_failure_keeps_submitted_downloads(downloader, tmp_path):
+    # The '/' makes the playlist file land in a folder that does not exist
+    playlist = PlaylistRecord(1, "House / Techno", None, 3)
+
+    with pytest.raises(ExportError) as error:
+        downloader.download(playlist, tracks=make_tracks(3))
+
+    assert sorted(error.value.failed) == ["json", "m3u8"]
+    assert len(error.value.tasks) == 3
+    assert not any(task.done() for task in error.value.tasks)
+    downloader.release.set()
+    assert [task.result(5) for task in error.value.tasks] == [track.path for track in make_tracks(3)]
+    assert sorted(downloader.downloaded) == [0, 1, 2]
+
+
+def test_json_and_json_lines_fail_separately(downloader, tmp_path):
+    json, json_lines = get_exporter_by_name("json"), get_exporter_by_name("jsonl")
+    downloader.exporters = [json, json_lines]
+    downloader.index = TrackIndex(str(tmp_path / "index.db"))
+
+    def fail(*args):
+        raise OSError("disk full")
+
+    json_lines.write_track = fail
+    downloader.release.set()
+    with pytest.raises(ExportError) as error:
+        downloader.download(PlaylistRecord(1, "Warmup", None, 3), tracks=make_tracks(3))
+
+    # Only the JSON Lines export is written in full next time
+    assert error.value.failed == ["jsonl"]
+    assert downloader.index.get_snapshot(1).formats == {"json"}
+    downloader.index.close()
+
+
+def test_only_buffering_exporters_are_flushed(downloader, tmp_path):
+    downloader.exporters.append(get_exporter_by_name("itunes"))
+    downloader.release.set()
+    downloader.download(PlaylistRecord(1, "Warmup", None, 3), tracks=make_tracks(3))
+    downloader.flush_exports()
+
+    assert [phase for phase in downloader.stats.phases if phase.startswith("flush.")] == ["flush.itunes"]
+    assert (tmp_path / "iTunes Library.xml").exists()
+
+
+def test_tracks_shared_between_playlists_download_once(downloader):
+    downloader.release.set()
+    first = downloader.download(PlaylistRecord(1, "Warmup", None, 3), tracks=make_tracks(3))
+    second = downloader.download(PlaylistRecord(2, "Peak", None, 3), tracks=make_tracks(3))
+
+    assert first == second
+    assert downloader.coalesced == 3
+    for task in second:
+        task.result(5)
+    assert sorted(downloader.downloaded) == [0, 1, 2]
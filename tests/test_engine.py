@@ -0,0 +1,225 @@
+import asyncio
+import heapq
+import threading
+
+import pytest
+
+from plex2mix.downloader import Downloader
+from plex2mix.engine import URGENT, ThreadEngine, _PriorityGate, _promote
+from plex2mix.records import TrackRecord
+
+
+class Blocked:
+    """Keeps a single-threaded engine busy until released, so submissions queue up."""
+
+    def __init__(self, engine: ThreadEngine) -> None:
+        self.started = threading.Event()
+        self.release = threading.Event()
+        engine.submit(self._run, priority=(-1,))
+        assert self.started.wait(5)
+
+    def _run(self) -> None:
+        self.started.set()
+        self.release.wait(5)
+
+
+@pytest.fixture
+def engine():
+    engine = ThreadEngine(1)
+    yield engine
+    engine.shutdown()
+
+
+def test_promote_moves_tagged_entries_first():
+    heap = []
+    for counter, (priority, tag) in enumerate([((2, 0), "a"), ((2, 1), "b"), ((1, 5), "a"), ((2, 2), "c")]):
+        heapq.heappush(heap, [priority, counter, tag])
+
+    assert _promote(heap, {"a", "c"}) == 3
+    order = [heapq.heappop(heap) for _ in range(len(heap))]
+    # Promoted entries keep their relative order and go before the others
+    assert [entry[2] for entry in order] == ["a", "a", "c", "b"]
+    assert order[0][0] == URGENT + (1, 5)
+
+
+def test_promote_is_idempotent():
+    heap = [[(2,), 0, "a"]]
+    assert _promote(heap, {"a"}) == 1
+    assert _promote(heap, {"a"}) == 0
+    assert heap[0][0] == URGENT + (2,)
+
+
+def test_thread_engine_runs_by_priority_then_submission(engine):
+    blocked = Blocked(engine)
+    order = []
+    for name, priority in [("c", (3,)), ("a1", (1,)), ("b", (2,)), ("a2", (1,))]:
+        engine.submit(order.append, name, priority=priority)
+    assert engine.pending() == 4
+
+    blocked.release.set()
+    engine.shutdown()
+    assert order == ["a1", "a2", "b", "c"]
+
+
+def test_thread_engine_promote(engine):
+    blocked = Blocked(engine)
+    order = []
+    for name, tag in [("x1", 1), ("y1", 2), ("x2", 1), ("y2", 2)]:
+        engine.submit(order.append, name, priority=(2, tag), tag=tag)
+
+    assert engine.promote({2}) == 2
+    blocked.release.set()
+    engine.shutdown()
+    assert order == ["y1", "y2", "x1", "x2"]
+
+
+def test_thread_engine_results_and_errors(engine):
+    assert engine.submit(sum, [1, 2, 3]).result(5) == 6
+    with pytest.raises(ZeroDivisionError):
+        engine.submit(lambda: 1 / 0).result(5)
+
+
+def test_thread_engine_skips_cancelled(engine):
+    blocked = Blocked(engine)
+    order = []
+    cancelled = engine.submit(order.append, "cancelled")
+    engine.submit(order.append, "kept")
+    assert cancelled.cancel()
+
+    blocked.release.set()
+    engine.shutdown()
+    assert order == ["kept"]
+
+
+def test_thread_engine_shutdown_drains_queue_and_rejects_new_work(engine):
+    blocked = Blocked(engine)
+    futures = [engine.submit(lambda i=i: i) for i in range(5)]
+    blocked.release.set()
+    engine.shutdown()
+
+    assert [future.result(0) for future in futures] == list(range(5))
+    with pytest.raises(RuntimeError):
+        engine.submit(print)
+    # A second shutdown, e.g. from ctx.call_on_close, is harmless
+    engine.shutdown()
+
+
+def run_gate(scenario):
+    async def main():
+        gate = _PriorityGate(1)
+        await gate.acquire((), None)
+        order = []
+
+        async def worker(name, priority, tag=None):
+            await gate.acquire(priority, tag)
+            order.append(name)
+            gate.release()
+
+        return await scenario(gate, worker, order)
+
+    return asyncio.run(main())
+
+
+def test_gate_hands_slots_by_priority():
+    async def scenario(gate, worker, order):
+        tasks = [asyncio.ensure_future(worker(name, priority))
+                 for name, priority in [("c", (3,)), ("a1", (1,)), ("b", (2,)), ("a2", (1,))]]
+        await asyncio.sleep(0)
+        assert len(gate.waiters) == 4
+        gate.release()
+        await asyncio.gather(*tasks)
+        return order, gate.free
+
+    order, free = run_gate(scenario)
+    assert order == ["a1", "a2", "b", "c"]
+    assert free == 1
+
+
+def test_gate_promote():
+    async def scenario(gate, worker, order):
+        tasks = [asyncio.ensure_future(worker(name, (2, tag), tag))
+                 for name, tag in [("x1", 1), ("y1", 2), ("x2", 1), ("y2", 2)]]
+        await asyncio.sleep(0)
+        assert gate.promote({2}) == 2
+        gate.release()
+        await asyncio.gather(*tasks)
+        return order
+
+    assert run_gate(scenario) == ["y1", "y2", "x1", "x2"]
+
+
+def test_gate_skips_cancelled_waiters():
+    async def scenario(gate, worker, order):
+        first = asyncio.ensure_future(worker("first", (1,)))
+        second = asyncio.ensure_future(worker("second", (2,)))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        gate.release()
+        await second
+        assert first.cancelled()
+        return order, gate.free
+
+    assert run_gate(scenario) == (["second"], 1)
+
+
+def test_gate_returns_slot_handed_to_a_cancelled_waiter():
+    async def scenario(gate, worker, order):
+        waiter = asyncio.ensure_future(gate.acquire((1,), None))
+        await asyncio.sleep(0)
+        # The slot is handed over, then the waiter is cancelled before it resumes
+        gate.release()
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        return gate.free
+
+    assert run_gate(scenario) == 1
+
+
+def make_track(i: int, size: int, duration: int) -> TrackRecord:
+    return TrackRecord(i, f"Track {i}", "Artist", "Album", duration, None, i, f"/parts/{i}", size, f"/music/{i}.flac")
+
+
+class Playlist:
+    def __init__(self, rating_key: int) -> None:
+        self.ratingKey = rating_key
+
+
+@pytest.mark.parametrize("order, pinned, expected", [
+    ("playlist", (), [1, 2, 3, 4]),
+    ("smallest", (), [3, 1, 4, 2]),
+    ("shortest", (), [4, 2, 3, 1]),
+    ("playlist", (20,), [3, 4, 1, 2]),
+    ("smallest", (20,), [3, 4, 1, 2]),
+])
+def test_download_order_policies(engine, order, pinned, expected):
+    downloaded = []
+    downloader = Downloader(None, "/music", "/playlists", engine=engine, order=order, pinned=pinned)
+    downloader._download_track = lambda track, overwrite: downloaded.append(track.ratingKey)
+    blocked = Blocked(engine)
+
+    first, second = Playlist(10), Playlist(20)
+    downloader._submit_track(first, make_track(1, 2000, 400))
+    downloader._submit_track(first, make_track(2, 9000, 200))
+    downloader._submit_track(second, make_track(3, 1000, 300))
+    downloader._submit_track(second, make_track(4, 5000, 100))
+
+    blocked.release.set()
+    engine.shutdown()
+    assert downloaded == expected
+
+
+def test_downloader_promote(engine):
+    downloaded = []
+    downloader = Downloader(None, "/music", "/playlists", engine=engine)
+    downloader._download_track = lambda track, overwrite: downloaded.append(track.ratingKey)
+    blocked = Blocked(engine)
+
+    for i, playlist in enumerate([Playlist(10), Playlist(10), Playlist(20), Playlist(20)], 1):
+        downloader._submit_track(playlist, make_track(i, 1000, 100))
+    assert downloader.promote([20]) == 2
+
+    blocked.release.set()
+    engine.shutdown()
+    assert downloaded == [3, 4, 1, 2]
@@ -0,0 +1,257 @@
+import io
+import plistlib
+import tracemalloc
+from datetime import datetime
+from xml.etree import ElementTree
+
+import pytest
+
+from plex2mix.exporter import ITunesExporter, _write_xml_plist
+from plex2mix.records import TrackRecord
+
+
+def make_tracks(count: int, start: int = 0, title: str = "Track") -> list:
+    return [
+        TrackRecord(i, f"{title} {i}", f"Artist {i % 50}", f"Album {i % 200}", 180000 + i, None,
+                    i, f"/library/parts/{i}/file.flac", 1000, f"/music/Artist {i % 50}/Album {i % 200}/{i}.flac")
+        for i in range(start, start + count)
+    ]
+
+
+def count_calls(monkeypatch, obj, name: str, calls: dict) -> None:
+    original = getattr(obj, name)
+
+    def counted(*args, **kwargs):
+        calls[name] = calls.get(name, 0) + 1
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(obj, name, counted)
+
+
+def peak_memory(fn, *args) -> int:
+    """Return the peak size of the Python allocations made while calling fn."""
+    tracemalloc.start()
+    try:
+        fn(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def load(path) -> dict:
+    with open(path, "rb") as f:
+        return plistlib.load(f)
+
+
+@pytest.fixture
+def library(tmp_path):
+    return tmp_path / "iTunes Library.xml"
+
+
+@pytest.fixture
+def binary_library(tmp_path):
+    return tmp_path / "iTunes Library.plist"
+
+
+def test_library_is_read_and_written_once_per_run(tmp_path, library, monkeypatch):
+    exporter = ITunesExporter()
+    exporter.export(make_tracks(10), playlist_name="Warmup", library_path=str(tmp_path))
+    exporter.flush()
+
+    calls = {}
+    count_calls(monkeypatch, exporter, "_read_library", calls)
+    count_calls(monkeypatch, exporter, "_save_library", calls)
+
+    for i in range(5):
+        exporter.export(make_tracks(10, start=i * 5), playlist_name=f"Set {i}", library_path=str(tmp_path))
+    exporter.flush()
+
+    assert calls == {"_read_library": 1, "_save_library": 1}
+    written = load(library)
+    assert [playlist["Name"] for playlist in written["Playlists"]] == ["Warmup"] + [f"Set {i}" for i in range(5)]
+    # Tracks shared between playlists are stored once
+    assert len(written["Tracks"]) == 30
+
+
+def test_next_run_reads_changes_made_to_the_library(tmp_path, library):
+    exporter = ITunesExporter()
+    exporter.export(make_tracks(3), playlist_name="Warmup", library_path=str(tmp_path))
+    exporter.flush()
+
+    # Another program edits the library between two runs of the same process
+    edited = load(library)
+    edited["Playlists"].append({"Name": "Added elsewhere", "Playlist ID": 99, "Playlist Items": []})
+    with open(library, "wb") as f:
+        plistlib.dump(edited, f)
+
+    exporter.export(make_tracks(3, start=3), playlist_name="Peak", library_path=str(tmp_path))
+    exporter.flush()
+
+    names = [playlist["Name"] for playlist in load(library)["Playlists"]]
+    assert names == ["Warmup", "Added elsewhere", "Peak"]
+
+
+def test_existing_playlist_is_replaced(tmp_path, library):
+    exporter = ITunesExporter()
+    exporter.export(make_tracks(5), playlist_name="Warmup", library_path=str(tmp_path))
+    exporter.flush()
+    exporter.export(make_tracks(2, start=10), playlist_name="Warmup", library_path=str(tmp_path))
+    exporter.flush()
+
+    playlists = load(library)["Playlists"]
+    assert len(playlists) == 1
+    assert len(playlists[0]["Playlist Items"]) == 2
+
+
+def test_append_extends_playlist_in_memory(tmp_path, library):
+    exporter = ITunesExporter()
+    exporter.export(make_tracks(5), playlist_name="Warmup", library_path=str(tmp_path))
+    exporter.flush()
+
+    assert not exporter.append(make_tracks(2, start=5), 4, playlist_name="Warmup", library_path=str(tmp_path))
+    assert exporter.append(make_tracks(2, start=5), 5, playlist_name="Warmup", library_path=str(tmp_path))
+    exporter.flush()
+
+    items = load(library)["Playlists"][0]["Playlist Items"]
+    assert len(items) == 7
+
+
+def rich_library() -> dict:
+    """A library using every plist type, nested the way iTunes and Rekordbox write them."""
+    added = datetime(2023, 4, 1, 12, 30, 5)
+    return {
+        "Major Version": 1,
+        "Minor Version": 1,
+        "Date": added,
+        "Application Version": "12.9",
+        "Show Content Ratings": True,
+        "Music Folder": "file:///Users/dj/Music/",
+        "Library Persistent ID": "0123456789ABCDEF",
+        "Features": {"Sync": {"Enabled": False, "Devices": ["Phone", "Laptop"]}, "Version": 5},
+        "Tracks": {
+            "1": {"Track ID": 1, "Name": "Rock & Roll <Live>", "Artist": "AC/DC", "Date Added": added,
+                  "Volume Adjustment": -0.25, "Compilation": True, "Artwork": b"\x89PNG\r\n\x1a\n\x00",
+                  "Location": "file:///Users/dj/Music/AC%20DC/Rock.mp3"},
+            "2": {"Track ID": 2, "Name": "", "Kind": "MPEG audio file", "Rating": 100, "Disabled": False,
+                  "Grouping": {"Tags": ["warmup", "peak"], "Energy": 7.5}},
+        },
+        "Playlists": [
+            {"Name": "Library", "Master": True, "Playlist ID": 1,
+             "Playlist Items": [{"Track ID": 1}, {"Track ID": 2}]},
+            {"Name": "Smart", "Playlist ID": 2, "Smart Info": b"\x01\x02\x03", "Smart Criteria": b"",
+             "Folder": {"Children": [{"Name": "Nested", "Items": [[1, 2], []]}]},
+             "Playlist Items": []},
+        ],
+    }
+
+
+def test_streaming_reader_matches_plistlib(tmp_path, library):
+    expected = rich_library()
+    with open(library, "wb") as f:
+        plistlib.dump(expected, f)
+
+    header, tracks, playlists = ITunesExporter()._read_library(str(library))
+
+    assert tracks == {int(key): track for key, track in expected.pop("Tracks").items()}
+    assert playlists == expected.pop("Playlists")
+    assert header == expected
+
+
+def test_streaming_reader_keeps_memory_below_a_dom_parse(tmp_path, library):
+    exporter = ITunesExporter()
+    exporter.export(make_tracks(5000), playlist_name="Library", library_path=str(tmp_path))
+    exporter.flush()
+
+    dom_peak = peak_memory(ElementTree.parse, str(library))
+    streaming_peak = peak_memory(ITunesExporter()._read_library, str(library))
+
+    # The tree alone takes more than twice what the streamed, converted library does
+    assert streaming_peak < dom_peak / 2
+
+
+def test_titles_are_escaped(tmp_path, library):
+    tracks = make_tracks(3)
+    tracks[0].title = "Drum & Bass <VIP>"
+    tracks[1].artist = "Daft Punk > Everyone"
+    tracks[2].title = "Bell\x07Ring\x1b"
+    exporter = ITunesExporter()
+    exporter.export(tracks, playlist_name="Rock & Roll <2024>", library_path=str(tmp_path))
+    exporter.flush()
+
+    written = load(library)
+    names = [track["Name"] for track in written["Tracks"].values()]
+    assert names == ["Drum & Bass <VIP>", "Track 1", "BellRing"]
+    assert written["Tracks"]["2"]["Artist"] == "Daft Punk > Everyone"
+    assert written["Playlists"][0]["Name"] == "Rock & Roll <2024>"
+
+
+def test_binary_format(tmp_path, library, binary_library):
+    exporter = ITunesExporter("binary")
+    exporter.export(make_tracks(3), playlist_name="Warmup", library_path=str(tmp_path))
+    exporter.flush()
+
+    assert not library.exists()
+    library = binary_library
+    assert library.read_bytes().startswith(b"bplist00")
+    written = load(library)
+    assert len(written["Tracks"]) == 3
+    assert written["Tracks"]["1"]["Total Time"] == 180000
+
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(ValueError):
+        ITunesExporter("json")
+
+
+@pytest.mark.parametrize("fmt", [plistlib.FMT_XML, plistlib.FMT_BINARY])
+def test_existing_library_is_merged(tmp_path, library, binary_library, fmt):
+    if fmt == plistlib.FMT_BINARY:
+        library = binary_library
+    existing = rich_library()
+    existing["Tracks"]["1"]["Location"] = "file://" + make_tracks(1)[0].path
+    with open(library, "wb") as f:
+        plistlib.dump(existing, f, fmt=fmt)
+
+    exporter = ITunesExporter("binary" if fmt == plistlib.FMT_BINARY else "xml")
+    exporter.export(make_tracks(2), playlist_name="Warmup", library_path=str(tmp_path))
+    exporter.flush()
+
+    written = load(library)
+    # The known location keeps its track, the new one gets the next free id
+    assert written["Playlists"][-1]["Playlist Items"] == [{"Track ID": 1}, {"Track ID": 3}]
+    assert written["Tracks"]["1"]["Artwork"] == existing["Tracks"]["1"]["Artwork"]
+    assert [playlist["Name"] for playlist in written["Playlists"]] == ["Library", "Smart", "Warmup"]
+    assert written["Date"] == existing["Date"]
+
+
+@pytest.mark.parametrize("plist_format", ["xml", "binary"])
+def test_large_library_round_trip(tmp_path, plist_format):
+    tracks = make_tracks(50000)
+    exporter = ITunesExporter(plist_format)
+    library = tmp_path / exporter.library_file
+    exporter.export(tracks, playlist_name="Everything", library_path=str(tmp_path))
+    exporter.export(tracks[::2], playlist_name="Evens", library_path=str(tmp_path))
+    exporter.flush()
+
+    written = load(library)
+    assert len(written["Tracks"]) == 50000
+    assert written["Tracks"]["12345"] == {
+        "Track ID": 12345, "Name": "Track 12344", "Artist": "Artist 44", "Album": "Album 144",
+        "Location": "file:///music/Artist 44/Album 144/12344.flac", "Total Time": 192000,
+    }
+    assert [len(playlist["Playlist Items"]) for playlist in written["Playlists"]] == [50000, 25000]
+
+    # Reading the library back yields what plistlib sees
+    header, read_tracks, playlists = ITunesExporter()._read_library(str(library))
+    assert read_tracks == {int(key): track for key, track in written.pop("Tracks").items()}
+    assert playlists == written.pop("Playlists")
+    assert header == written
+
+
+def test_xml_writer_output_loads_with_plistlib():
+    plist = rich_library()
+    plist["Tracks"]["3"] = {"Track ID": 3, "Name": "Tab\tand\nnewline", "Play Count": 0, "Skipped": False}
+    out = io.BytesIO()
+    _write_xml_plist(out, plist)
+
+    assert plistlib.loads(out.getvalue()) == plist
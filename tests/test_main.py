@@ -0,0 +1,31 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("click")
+pytest.importorskip("yaml")
+
+from plex2mix.main import download_playlists
+from plex2mix.stats import RunStats
+
+
+class FailingCatalog:
+    def playlists(self):
+        raise ConnectionError("server unreachable")
+
+
+@pytest.fixture
+def ctx():
+    downloader = SimpleNamespace(start_run=lambda: None)
+    return SimpleNamespace(obj={"stats": RunStats(), "downloader": downloader, "catalog": FailingCatalog()})
+
+
+def test_download_errors_are_reported_and_swallowed(ctx, capsys):
+    download_playlists(ctx, [0])
+
+    assert "Error during download: server unreachable" in capsys.readouterr().err
+
+
+def test_download_errors_are_raised_for_the_daemon(ctx):
+    with pytest.raises(ConnectionError):
+        download_playlists(ctx, [0], raise_errors=True)
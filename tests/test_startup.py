@@ -0,0 +1,44 @@
+import os
+import sys
+import json
+import subprocess
+
+import pytest
+
+pytest.importorskip("click")
+pytest.importorskip("yaml")
+
+# Seconds a cold import of the CLI may take, well above the ~0.1s it needs,
+# but far below what importing plexapi and connecting to a server costs
+COLD_START_BUDGET = 0.5
+HEAVY_MODULES = ("plexapi", "plex2mix.downloader", "plex2mix.exporter", "plex2mix.index")
+
+PROBE = """
+import sys, json, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"elapsed": elapsed, "loaded": [name for name in {heavy!r} if name in sys.modules]}}))
+"""
+
+
+def cold_import(module: str) -> dict:
+    """Import a module in a fresh interpreter, returning its import time and the heavy modules it pulled in."""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    output = subprocess.run([sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY_MODULES)],
+                            check=True, capture_output=True, text=True, env=env).stdout
+    return json.loads(output)
+
+
+def test_package_import_does_not_load_cli():
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    output = subprocess.run([sys.executable, "-c", "import sys, plex2mix; print('click' in sys.modules)"],
+                            check=True, capture_output=True, text=True, env=env).stdout
+    assert output.strip() == "False"
+
+
+def test_cli_import_is_lazy_and_fast():
+    # Best of a few runs, so a busy machine does not fail the budget
+    results = [cold_import("plex2mix.main") for _ in range(3)]
+    assert results[0]["loaded"] == []
+    assert min(result["elapsed"] for result in results) < COLD_START_BUDGET
@@ -0,0 +1,135 @@
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+requests = pytest.importorskip("requests")
+
+from plex2mix import transfer
+
+PAYLOAD = bytes(range(256)) * 4096
+
+
+class Handler(BaseHTTPRequestHandler):
+    """Serves PAYLOAD, honouring Range requests unless the server's mode says otherwise."""
+
+    def do_GET(self) -> None:
+        server = self.server
+        server.ranges.append(self.headers.get("Range"))
+        body = PAYLOAD
+        status = 200
+        requested = self.headers.get("Range")
+
+        if requested and server.mode == "reject-range":
+            server.mode = "normal"
+            self.send_response(416)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if requested and server.mode != "ignore-range":
+            start = int(requested.split("=")[1].rstrip("-"))
+            body = PAYLOAD[start:]
+            status = 206
+        if server.mode == "short":
+            body = body[:len(body) // 2]
+
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    httpd.mode = "normal"
+    httpd.ranges = []
+    thread = threading.Thread(target=httpd.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def url(server) -> str:
+    return f"http://127.0.0.1:{server.server_address[1]}/file"
+
+
+def test_fetch_downloads_whole_file(server, tmp_path):
+    target = str(tmp_path / "track.flac")
+    with requests.Session() as session:
+        transferred = transfer.fetch(session, url(server), target, len(PAYLOAD))
+
+    assert transferred == len(PAYLOAD)
+    assert open(target, "rb").read() == PAYLOAD
+    assert not os.path.exists(transfer.part_path(target))
+    assert server.ranges == [None]
+
+
+def test_fetch_resumes_part_file(server, tmp_path):
+    target = str(tmp_path / "track.flac")
+    with open(transfer.part_path(target), "wb") as f:
+        f.write(PAYLOAD[:1000])
+
+    with requests.Session() as session:
+        transferred = transfer.fetch(session, url(server), target, len(PAYLOAD))
+
+    assert transferred == len(PAYLOAD) - 1000
+    assert open(target, "rb").read() == PAYLOAD
+    assert server.ranges == ["bytes=1000-"]
+
+
+def test_fetch_restarts_when_resume_is_rejected(server, tmp_path):
+    target = str(tmp_path / "track.flac")
+    with open(transfer.part_path(target), "wb") as f:
+        f.write(b"stale" * 100)
+    server.mode = "reject-range"
+
+    with requests.Session() as session:
+        transferred = transfer.fetch(session, url(server), target, len(PAYLOAD))
+
+    assert transferred == len(PAYLOAD)
+    assert open(target, "rb").read() == PAYLOAD
+    assert server.ranges == ["bytes=500-", None]
+
+
+def test_fetch_restarts_when_range_is_ignored(server, tmp_path):
+    target = str(tmp_path / "track.flac")
+    with open(transfer.part_path(target), "wb") as f:
+        f.write(PAYLOAD[:1000])
+    server.mode = "ignore-range"
+
+    with requests.Session() as session:
+        transferred = transfer.fetch(session, url(server), target, len(PAYLOAD))
+
+    assert transferred == len(PAYLOAD)
+    assert open(target, "rb").read() == PAYLOAD
+
+
+def test_short_read_leaves_no_final_file(server, tmp_path):
+    target = str(tmp_path / "track.flac")
+    server.mode = "short"
+
+    with requests.Session() as session:
+        with pytest.raises(IOError):
+            transfer.fetch(session, url(server), target, len(PAYLOAD))
+
+    assert not os.path.exists(target)
+    # What did arrive is kept for the next attempt to resume from
+    assert os.path.getsize(transfer.part_path(target)) == len(PAYLOAD) // 2
+
+
+def test_fetch_removes_corrupt_copy(server, tmp_path):
+    target = str(tmp_path / "track.flac")
+    with open(transfer.corrupt_path(target), "wb") as f:
+        f.write(b"garbage")
+
+    with requests.Session() as session:
+        transfer.fetch(session, url(server), target, len(PAYLOAD))
+
+    assert open(target, "rb").read() == PAYLOAD
+    assert not os.path.exists(transfer.corrupt_path(target))